@@ -531,6 +531,9 @@ class Config:
     def get_content_generator_max_retries(self) -> Optional[int]:
         return self.content_generator['maxRetries'] if self.content_generator else None
 
+    def get_content_generator_max_concurrency(self) -> Optional[int]:
+        return self.content_generator.get('maxConcurrency') if self.content_generator else None
+
     def get_system_prompt_mappings(self) -> Optional[List[Dict[str, Any]]]:
         return self.system_prompt_mappings
 
@@ -396,6 +396,11 @@ class GeminiClient:
                 return turn
             yield event
 
+        # 流结束时检测尚未处理的累积内容
+        if self.loop_detector.flush_pending_content():
+            yield {'type': GeminiEventType.LoopDetected}
+            return turn
+
         if not turn.pending_tool_calls and signal and not signal.done():
             # Check if model was switched during the call (likely due to quota error)
             current_model = self.config.get_model()
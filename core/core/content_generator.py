@@ -67,6 +67,7 @@ class ContentGeneratorConfig:
         maxRetries: Optional[int] = None,
         samplingParams: Optional[Dict[str, Any]] = None,
         proxy: Optional[str] = None,
+        maxConcurrency: Optional[int] = None,
     ):
         self.model = model
         self.apiKey = apiKey
@@ -77,6 +78,7 @@ class ContentGeneratorConfig:
         self.maxRetries = maxRetries
         self.samplingParams = samplingParams
         self.proxy = proxy
+        self.maxConcurrency = maxConcurrency
 
 async def create_code_assist_content_generator(
     httpOptions: Dict[str, Any],
@@ -126,6 +128,7 @@ def create_content_generator_config(
         enableOpenAILogging=config.getEnableOpenAILogging(),
         timeout=config.getContentGeneratorTimeout(),
         maxRetries=config.getContentGeneratorMaxRetries(),
+        maxConcurrency=config.get_content_generator_max_concurrency(),
         samplingParams=config.getSamplingParams(),
     )
 
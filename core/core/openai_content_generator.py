@@ -5,11 +5,15 @@ SPDX-License-Identifier: Apache-2.0
 """
 
 from dataclasses import dataclass
+import asyncio
+import importlib.util
 import os
 import json
+import platform
+import re
 from datetime import datetime
-from typing import AsyncGenerator, Dict, List, Optional, Set, Any, Union, TypeVar, Protocol
-from collections import defaultdict
+from typing import AsyncGenerator, Dict, Iterator, List, Optional, Set, Any, Tuple, Union, TypeVar, Protocol
+from collections import OrderedDict
 
 # 导入相关类型和接口
 from google.genai.types import (
@@ -31,13 +35,151 @@ from google.genai.types import (
     GenerateContentConfig
 )
 from .content_generator import ContentGenerator
-from openai import OpenAI
+from openai import AsyncOpenAI
 import openai 
+import httpx
+
+try:
+    # 可选依赖（openai[aiohttp] 附带）：以 aiohttp 作为 httpx 的底层传输，高并发下吞吐更稳定
+    from httpx_aiohttp import AiohttpTransport
+except ImportError:
+    AiohttpTransport = None
 from ..telemetry.loggers import log_api_response
 from ..telemetry.types import ApiResponseEvent
 from ..config.config import Config
 from ..utils.openai_logger import openai_logger
 
+# 进程内共享的 AsyncOpenAI 客户端，先按事件循环、再按连接参数区分；复用同一个 httpx
+# 连接池，避免每个生成器各建一个连接池、每次请求重新握手。客户端的连接绑定在首次使用
+# 它的事件循环上，不能跨循环（例如多次 asyncio.run）复用
+_client_cache: Dict[asyncio.AbstractEventLoop, Dict[tuple, AsyncOpenAI]] = {}
+
+# 参数 schema 中需要做类型 / 数值转换的键
+_SCHEMA_CONVERTED_KEYS = frozenset({
+    'type', 'minimum', 'maximum', 'multipleOf', 'minLength', 'maxLength', 'minItems', 'maxItems',
+})
+
+# 错误消息中的超时指示符。'timeout' 已覆盖 connection/request/read timeout，
+# 'timed out' 已覆盖 OpenAI 的 'request timed out'
+_TIMEOUT_MESSAGE_PATTERN = re.compile(r'timeout|timed out|etimedout|esockettimedout|deadline exceeded')
+_TIMEOUT_ERROR_CODES = frozenset({'ETIMEDOUT', 'ESOCKETTIMEDOUT'})
+
+# 每个生成器缓存的已转换工具 schema 数量上限
+_TOOL_SCHEMA_CACHE_SIZE = 64
+
+# 每个生成器默认允许的并发请求数
+DEFAULT_MAX_CONCURRENCY = 32
+
+# 安装了 h2 时启用 HTTP/2，同一连接上可多路复用并发请求
+_HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+def _get_async_client(
+    api_key: str,
+    base_url: Optional[str],
+    default_headers: Dict[str, str],
+    timeout: float,
+    max_retries: int,
+) -> AsyncOpenAI:
+    """获取（或创建）当前事件循环中指定连接参数对应的共享 AsyncOpenAI 客户端"""
+    loop = asyncio.get_running_loop()
+    clients = _client_cache.get(loop)
+    if clients is None:
+        # 已关闭的事件循环上的客户端无法再使用，也无法再关闭，直接丢弃引用
+        for stale_loop in [l for l in _client_cache if l.is_closed()]:
+            del _client_cache[stale_loop]
+        clients = _client_cache[loop] = {}
+
+    key = (api_key, base_url, tuple(sorted(default_headers.items())), timeout, max_retries)
+    client = clients.get(key)
+    if client is None:
+        if AiohttpTransport is not None:
+            # 连接池由 aiohttp 管理，httpx 的 limits / http2 设置对自定义传输不生效
+            http_client = httpx.AsyncClient(transport=AiohttpTransport(), timeout=timeout)
+        else:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=1000,
+                    max_keepalive_connections=200,
+                    keepalive_expiry=30,
+                ),
+                timeout=timeout,
+                http2=_HTTP2_AVAILABLE,
+            )
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=max_retries,
+            default_headers=default_headers,
+            http_client=http_client,
+        )
+        clients[key] = client
+    return client
+
+
+# tiktoken 编码器在首次计数时加载（BPE 表加载开销较大），之后复用；
+# 加载失败时缓存为 None，后续直接使用字符近似
+_encoding: Any = None
+_encoding_loaded = False
+
+
+def _get_encoding() -> Any:
+    """获取 tiktoken 的 cl100k_base 编码器（GPT-4编码，但用于qwen估计），不可用时返回 None"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            # 动态导入tiktoken以避免依赖问题
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception as error:
+            print(f"加载tiktoken失败，回退到字符近似：{error}")
+        _encoding_loaded = True
+    return _encoding
+
+
+def _iter_text(obj: Any) -> Iterator[str]:
+    """依次产出内容中的文本片段，供 str.join 直接消费（不构建中间列表）
+
+    字符串原样产出；列表逐项展开；带 parts 的内容（对象或字典形式）逐个产出
+    part 的文本；其余对象产出其 text（没有时为空字符串，与原先的拼接结果保持一致）。
+    """
+    if isinstance(obj, str):
+        yield obj
+        return
+    if isinstance(obj, list):
+        for item in obj:
+            yield from _iter_text(item)
+        return
+    if isinstance(obj, Part):
+        yield obj.text or ''
+        return
+    if isinstance(obj, dict):
+        parts = obj.get('parts')
+        if parts is None:
+            yield obj.get('text') or ''
+            return
+    else:
+        parts = obj.parts if isinstance(obj, Content) else getattr(obj, 'parts', None)
+        if parts is None:
+            yield getattr(obj, 'text', None) or ''
+            return
+    for part in parts:
+        if isinstance(part, str):
+            yield part
+        elif isinstance(part, Part):
+            yield part.text or ''
+        elif isinstance(part, dict):
+            yield part.get('text') or ''
+        else:
+            yield getattr(part, 'text', None) or ''
+
+
+def _estimate_tokens_from_text(contents: Any) -> int:
+    """按文本长度粗略估计 token 数（1 token ≈ 4个字符），无需 JSON 序列化"""
+    return max(1, sum(map(len, _iter_text(contents))) // 4)
+
+
 # models.generate_content 的配置参数
 @dataclass
 class GenerateContentParameters:
@@ -100,18 +242,12 @@ class OpenAIResponseFormat(Protocol):
 
 
 class OpenAIContentGenerator(ContentGenerator):
-    def __init__(self, client, model: str, config: Config):
-        self._client = client
+    def __init__(self, api_key: str, model: str, config: Config):
         self.__model = model
         self.__config = config
-        self.__streaming_tool_calls: Dict[int, Dict] = {}
-        ''' __streaming_tool_calls 的结构如下：
-        {
-            id?: string;
-            name?: string;
-            arguments: string;
-        }
-         '''
+        # 已转换的 OpenAI 工具定义，按 Tool 对象缓存：id(tool) -> (tool, 转换结果)。
+        # 同时持有 tool 本身，保证缓存期间其 id 不会被其他对象复用
+        self.__tool_schema_cache: 'OrderedDict[int, Tuple[Any, List[Dict[str, Any]]]]' = OrderedDict()
 
         self.__model = model
         self.__config = config
@@ -128,15 +264,22 @@ class OpenAIContentGenerator(ContentGenerator):
         }
 
         # 允许配置覆盖超时设置
-        content_generator_config = self.config.get_content_generator_config()
+        content_generator_config = self.__config.get_content_generator_config()
         if content_generator_config and content_generator_config.timeout:
             timeout_config['timeout'] = content_generator_config.timeout
-        if content_generator_config and content_generator_config.max_retries is not None:
-            timeout_config['max_retries'] = content_generator_config.max_retries
+        if content_generator_config and content_generator_config.maxRetries is not None:
+            timeout_config['max_retries'] = content_generator_config.maxRetries
+
+        # 限制同时进行的请求数，避免大量并发请求挤占连接池并触发服务端限流
+        self.__max_concurrency = DEFAULT_MAX_CONCURRENCY
+        if content_generator_config and content_generator_config.maxConcurrency:
+            self.__max_concurrency = content_generator_config.maxConcurrency
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
 
         # 设置User-Agent头（与contentGenerator.ts相同格式）
         version = os.environ.get('CLI_VERSION', '') or str(os.sys.version)
-        user_agent = f"QwenCode/{version} ({os.sys.platform}; {os.sys.arch})".replace('\n', '')
+        user_agent = f"QwenCode/{version} ({os.sys.platform}; {platform.machine()})".replace('\n', '')
 
         # 检查是否使用OpenRouter并添加所需的头
         is_open_router = 'openrouter.ai' in base_url
@@ -148,14 +291,29 @@ class OpenAIContentGenerator(ContentGenerator):
             } if is_open_router else {})
         }
 
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            timeout=timeout_config['timeout'] / 1000,  # OpenAI Python客户端使用秒而不是毫秒
-            max_retries=timeout_config['max_retries'],
-            default_headers=default_headers,
-        )
-        self.streaming_tool_calls: Dict[int, Dict[str, Any]] = defaultdict(lambda: {'arguments': ''})
+        # 各请求在协程中 await 调用，需使用异步客户端，避免同步请求阻塞事件循环；
+        # 客户端在使用时按当前事件循环获取，连接参数相同的生成器共享同一个客户端及其连接池
+        self.__client_params: Dict[str, Any] = {
+            'api_key': api_key,
+            'base_url': base_url or None,  # 未设置时使用 SDK 默认地址
+            'timeout': timeout_config['timeout'] / 1000,  # OpenAI Python客户端使用秒而不是毫秒
+            'max_retries': timeout_config['max_retries'],
+            'default_headers': default_headers,
+        }
+
+    @property
+    def _client(self) -> AsyncOpenAI:
+        """当前事件循环中的共享 AsyncOpenAI 客户端（须在协程中访问）"""
+        return _get_async_client(**self.__client_params)
+
+    @property
+    def _request_semaphore(self) -> asyncio.Semaphore:
+        """当前事件循环中的并发请求信号量（信号量同样绑定在首次等待它的事件循环上）"""
+        loop = asyncio.get_running_loop()
+        if self.__semaphore_loop is not loop:
+            self.__semaphore = asyncio.Semaphore(self.__max_concurrency)
+            self.__semaphore_loop = loop
+        return self.__semaphore
 
     """
     子类钩子来自定义错误处理行为
@@ -173,25 +331,14 @@ class OpenAIContentGenerator(ContentGenerator):
         if not error:
             return False
 
-        error_message = str(error).lower() if not isinstance(error, Exception) else str(error).lower()
-        error_code = getattr(error, 'code', None)
-        error_type = getattr(error, 'type', None)
+        if isinstance(error, (TimeoutError, openai.APITimeoutError)):
+            return True
 
-        # 检查常见的超时指示符
+        # 检查常见的超时指示符（一次正则扫描覆盖全部消息关键字）
         return (
-            'timeout' in error_message or
-            'timed out' in error_message or
-            'connection timeout' in error_message or
-            'request timeout' in error_message or
-            'read timeout' in error_message or
-            'etimedout' in error_message or  # 在消息检查中包含ETIMEDOUT
-            'esockettimedout' in error_message or  # 在消息检查中包含ESOCKETTIMEDOUT
-            error_code == 'ETIMEDOUT' or
-            error_code == 'ESOCKETTIMEDOUT' or
-            error_type == 'timeout' or
-            # OpenAI特定的超时指示符
-            'request timed out' in error_message or
-            'deadline exceeded' in error_message
+            _TIMEOUT_MESSAGE_PATTERN.search(str(error).lower()) is not None or
+            getattr(error, 'code', None) in _TIMEOUT_ERROR_CODES or
+            getattr(error, 'type', None) == 'timeout'
         )
 
     async def generate_content(
@@ -201,6 +348,11 @@ class OpenAIContentGenerator(ContentGenerator):
     ) -> GoogleGenerateContentResponse:
         start_time = datetime.now()
         messages = self.__convert_to_openai_format(request)
+        # 内容生成配置在单次请求内不变，只读取一次
+        content_generator_config = self.__config.get_content_generator_config()
+        auth_type = content_generator_config.authType if content_generator_config else None
+        enable_openai_logging = bool(content_generator_config and content_generator_config.enableOpenAILogging)
+        session_id = self.__config.get_session_id() if hasattr(self.__config, 'get_session_id') else None
 
         try:
             # 构建采样参数，优先级明确：
@@ -210,11 +362,11 @@ class OpenAIContentGenerator(ContentGenerator):
             sampling_params = self.build_sampling_parameters(request)
 
             create_params: Dict[str, Any] = {
-                'model': self.model,
+                'model': self.__model,
                 'messages': messages,
                 **sampling_params,
                 'metadata': {
-                    'sessionId': self.__config.get_session_id() if hasattr(self.__config, 'get_session_id') else None,
+                    'sessionId': session_id,
                     'promptId': user_prompt_id,
                 },
             }
@@ -224,7 +376,8 @@ class OpenAIContentGenerator(ContentGenerator):
                     request["config"]["tools"]
                 )
 
-            completion = await self._client.chat.completions.create(**create_params)
+            async with self._request_semaphore:
+                completion = await self._client.chat.completions.create(**create_params)
 
             response = self.__convert_to_gemini_format(completion)
             duration_ms = (datetime.now() - start_time).total_seconds() * 1000
@@ -234,14 +387,14 @@ class OpenAIContentGenerator(ContentGenerator):
                 self.__model,
                 duration_ms,
                 user_prompt_id,
-                self.config.get_content_generator_config().auth_type if self.config.get_content_generator_config() else None,
+                auth_type,
                 response.usage_metadata,
             )
 
-            log_api_response(self.config, response_event)
+            log_api_response(self.__config, response_event)
 
             # 如果启用，则记录交互
-            if self.__config.get_content_generator_config() and self.__config.get_content_generator_config().enable_openai_logging:
+            if enable_openai_logging:
                 openai_request = await self.__convert_gemini_request_to_openai(request)
                 openai_response = self.__convert_gemini_response_to_openai(response)
                 await openai_logger.log_interaction(openai_request, openai_response)
@@ -258,34 +411,14 @@ class OpenAIContentGenerator(ContentGenerator):
 
             # 即使出现错误也要估计token使用量
             # 这有助于跟踪失败请求的成本和使用情况
-            estimated_usage = None
-            try:
-                token_count_result = await self.count_tokens({
-                    'contents': request.contents,
-                    'model': self.__model,
-                })
-                estimated_usage = {
-                    'promptTokenCount': token_count_result.total_tokens,
-                    'candidatesTokenCount': 0,  # 由于请求失败，没有完成tokens
-                    'totalTokenCount': token_count_result.total_tokens,
-                }
-            except Exception:
-                # 如果token计数也失败，提供最小估计
-                import json
-                content_str = json.dumps(request.contents)
-                estimated_tokens = max(1, len(content_str)+3 // 4)  # 粗略估计：1 token ≈ 4个字符
-                estimated_usage = {
-                    'promptTokenCount': estimated_tokens,
-                    'candidatesTokenCount': 0,
-                    'totalTokenCount': estimated_tokens,
-                }
+            estimated_usage = await self.__estimate_failed_request_usage(request, enable_openai_logging)
 
             # 使用估计的使用量记录UI遥测的API错误事件
             error_event = ApiResponseEvent(
                 self.__model,
                 duration_ms,
                 user_prompt_id,
-                self.__config.get_content_generator_config().auth_type if self.__config.get_content_generator_config() else None,
+                auth_type,
                 estimated_usage,
                 None,
                 error_message,
@@ -293,7 +426,7 @@ class OpenAIContentGenerator(ContentGenerator):
             log_api_response(self.__config, error_event)
 
             # 如果启用，则记录错误交互
-            if self.__config.get_content_generator_config() and self.__config.get_content_generator_config().enable_openai_logging:
+            if enable_openai_logging:
                 openai_request = await self.__convert_gemini_request_to_openai(request)
                 await openai_logger.log_interaction(
                     openai_request,
@@ -324,6 +457,11 @@ class OpenAIContentGenerator(ContentGenerator):
     ) -> AsyncGenerator[GoogleGenerateContentResponse, None]:
         start_time = datetime.now()
         messages = self.__convert_to_openai_format(request)
+        # 内容生成配置在单次请求内不变，只读取一次
+        content_generator_config = self.__config.get_content_generator_config()
+        auth_type = content_generator_config.authType if content_generator_config else None
+        enable_openai_logging = bool(content_generator_config and content_generator_config.enableOpenAILogging)
+        session_id = self.__config.get_session_id() if hasattr(self.__config, 'get_session_id') else None
 
         try:
             # 构建采样参数，优先级明确
@@ -336,7 +474,7 @@ class OpenAIContentGenerator(ContentGenerator):
                 'stream': True,
                 'stream_options': {'include_usage': True},
                 'metadata': {
-                    'sessionId': self.__config.get_session_id() if hasattr(self.__config, 'get_session_id') else None,
+                    'sessionId': session_id,
                     'promptId': user_prompt_id,
                 },
             }
@@ -346,7 +484,10 @@ class OpenAIContentGenerator(ContentGenerator):
                     request.config.tools
                 )
 
-            stream = await self._client.chat.completions.create(**create_params)
+            # create 在收到响应头后即返回流对象；信号量只在建立流期间持有，
+            # 不会在逐块读取流式响应时一直占用
+            async with self._request_semaphore:
+                stream = await self._client.chat.completions.create(**create_params)
 
             original_stream = self.__stream_generator(stream)
 
@@ -374,14 +515,14 @@ class OpenAIContentGenerator(ContentGenerator):
                         self.__model,
                         duration_ms,
                         user_prompt_id,
-                        self.__config.get_content_generator_config().auth_type if self.__config.get_content_generator_config() else None,
+                        auth_type,
                         final_usage_metadata,
                     )
 
                     log_api_response(self.__config, response_event)
 
                     # 如果启用，则记录交互（与generateContent方法相同）
-                    if self.__config.get_content_generator_config() and self.__config.get_content_generator_config().enable_openai_logging:
+                    if enable_openai_logging:
                         openai_request = await self.__convert_gemini_request_to_openai(request)
                         # 对于流式传输，我们将所有响应合并为一个响应进行记录
                         combined_response = self.__combine_stream_responses_for_logging(responses)
@@ -396,33 +537,14 @@ class OpenAIContentGenerator(ContentGenerator):
                     error_message = f"流式请求在{round(duration_ms / 1000)}秒后超时。尝试减少输入长度或增加配置中的超时时间。" if is_timeout_error else str(error)
 
                     # 即使在流式传输中出现错误，也要估计token使用量
-                    estimated_usage = None
-                    try:
-                        token_count_result = await self.count_tokens({
-                            'contents': request.contents,
-                            'model': self.__model,
-                        })
-                        estimated_usage = {
-                            'promptTokenCount': token_count_result.total_tokens,
-                            'candidatesTokenCount': 0,  # 由于请求失败，没有完成tokens
-                            'totalTokenCount': token_count_result.total_tokens,
-                        }
-                    except Exception:
-                        # 如果token计数也失败，提供最小估计
-                        content_str = json.dumps(request.contents)
-                        estimated_tokens = max(1, len(content_str) // 4)  # 粗略估计：1 token ≈ 4个字符
-                        estimated_usage = {
-                            'promptTokenCount': estimated_tokens,
-                            'candidatesTokenCount': 0,
-                            'totalTokenCount': estimated_tokens,
-                        }
+                    estimated_usage = await self.__estimate_failed_request_usage(request, enable_openai_logging)
 
                     # 使用估计的使用量记录UI遥测的API错误事件
                     error_event = ApiResponseEvent(
                         self.__model,
                         duration_ms,
                         user_prompt_id,
-                        self.__config.get_content_generator_config().auth_type if self.__config.get_content_generator_config() else None,
+                        auth_type,
                         estimated_usage,
                         None,
                         error_message,
@@ -430,7 +552,7 @@ class OpenAIContentGenerator(ContentGenerator):
                     log_api_response(self.__config, error_event)
 
                     # 如果启用，则记录错误交互
-                    if self.__config.get_content_generator_config() and self.__config.get_content_generator_config().enable_openai_logging:
+                    if enable_openai_logging:
                         openai_request = await self.__convert_gemini_request_to_openai(request)
                         await openai_logger.log_interaction(
                             openai_request,
@@ -462,33 +584,14 @@ class OpenAIContentGenerator(ContentGenerator):
             error_message = f"流式设置在{round(duration_ms / 1000)}秒后超时。尝试减少输入长度或增加配置中的超时时间。" if is_timeout_error else str(error)
 
             # 即使在流式设置中出现错误，也要估计token使用量
-            estimated_usage = None
-            try:
-                token_count_result = await self.count_tokens({
-                    'contents': request.contents,
-                    'model': self.__model,
-                })
-                estimated_usage = {
-                    'promptTokenCount': token_count_result.total_tokens,
-                    'candidatesTokenCount': 0,  # 由于请求失败，没有完成tokens
-                    'totalTokenCount': token_count_result.total_tokens,
-                }
-            except Exception:
-                # 如果token计数也失败，提供最小估计
-                content_str = json.dumps(request.contents)
-                estimated_tokens = max(1, len(content_str) // 4)  # 粗略估计：1 token ≈ 4个字符
-                estimated_usage = {
-                    'promptTokenCount': estimated_tokens,
-                    'candidatesTokenCount': 0,
-                    'totalTokenCount': estimated_tokens,
-                }
+            estimated_usage = await self.__estimate_failed_request_usage(request, enable_openai_logging)
 
             # 使用估计的使用量记录UI遥测的API错误事件
             error_event = ApiResponseEvent(
                 self.__model,
                 duration_ms,
                 user_prompt_id,
-                self.__config.get_content_generator_config().auth_type if self.__config.get_content_generator_config() else None,
+                auth_type,
                 estimated_usage,
                 None,
                 error_message,
@@ -515,11 +618,13 @@ class OpenAIContentGenerator(ContentGenerator):
         self, 
         stream: Any  # AsyncIterable[OpenAI.Chat.ChatCompletionChunk]
     ) -> AsyncGenerator[GoogleGenerateContentResponse, None]:
-        # 为每个新流重置累加器
-        self.streaming_tool_calls.clear()
+        # 每个流使用自己的工具调用累加器，并发的流之间互不干扰。
+        # arguments 为参数片段列表，在 finish_reason 时一次性拼接，
+        # 避免对字典中的字符串反复 += 造成的二次复制
+        streaming_tool_calls: Dict[int, Dict[str, Any]] = {}
 
         async for chunk in stream:
-            yield self.__convert_stream_chunk_to_gemini_format(chunk)
+            yield self.__convert_stream_chunk_to_gemini_format(chunk, streaming_tool_calls)
 
     """
     合并流式响应用于日志记录目的
@@ -585,26 +690,44 @@ class OpenAIContentGenerator(ContentGenerator):
 
         return combined_response
 
+    async def __estimate_failed_request_usage(
+        self,
+        request: GenerateContentParameters,
+        accurate: bool,
+    ) -> Dict[str, int]:
+        """估计失败请求的 token 使用量，用于遥测
+
+        默认按文本长度粗略估计；只有启用了 OpenAI 交互日志（accurate）时才调用 count_tokens 精确计数。
+        """
+        estimated_tokens = None
+        if accurate:
+            try:
+                estimated_tokens = (await self.count_tokens(request))['totalTokens']
+            except Exception:
+                pass
+        if estimated_tokens is None:
+            estimated_tokens = _estimate_tokens_from_text(request.contents)
+        return {
+            'promptTokenCount': estimated_tokens,
+            'candidatesTokenCount': 0,  # 由于请求失败，没有完成tokens
+            'totalTokenCount': estimated_tokens,
+        }
+
     async def count_tokens(
         self, 
         request: CountTokensParameters
     ) -> GoogleCountTokensResponse:
         # 使用tiktoken进行准确的token计数
         content = json.dumps(request.contents)
-        total_tokens = 0
+        total_tokens = None
 
-        try:
-            # 动态导入tiktoken以避免依赖问题
-            import importlib.util
-            if importlib.util.find_spec('tiktoken') is not None:
-                from tiktoken import get_encoding
-                encoding = get_encoding('cl100k_base')  # GPT-4编码，但用于qwen估计
+        encoding = _get_encoding()
+        if encoding is not None:
+            try:
                 total_tokens = len(encoding.encode(content))
-                # 注意：Python中tiktoken没有free()方法
-            else:
-                raise ImportError("tiktoken not found")
-        except Exception as error:
-            print(f"加载tiktoken失败，回退到字符近似：{error}")
+            except Exception as error:
+                print(f"tiktoken计数失败，回退到字符近似：{error}")
+        if total_tokens is None:
             # 回退：使用字符计数进行粗略近似
             total_tokens = max(1, len(content) // 4)  # 粗略估计：1 token ≈ 4个字符
 
@@ -617,31 +740,13 @@ class OpenAIContentGenerator(ContentGenerator):
         request: EmbedContentParameters
     ) -> GoogleEmbedContentResponse:
         # 从内容中提取文本
-        text = ''
-        if isinstance(request.contents, list):
-            text = ' '.join([
-                content if isinstance(content, str) else 
-                ' '.join([
-                    part if isinstance(part, str)
-                    else '' 
-                    for part in content.parts
-                ]) if hasattr(content, 'parts') else ''
-                for content in request.contents
-            ])
-        elif request.contents:
-            if isinstance(request.contents, str):
-                text = request.contents
-            elif hasattr(request.contents, 'parts') and request.contents.parts:
-                text = ' '.join([
-                    part if isinstance(part, str) else getattr(part, 'text', '')
-                    for part in getattr(request.contents, 'parts', [])
-                ])
+        text = ' '.join(_iter_text(request.contents)) if request.contents else ''
 
         try:
-            embedding = await self.client.embeddings.create({
-                'model': 'text-embedding-ada-002',  # 默认嵌入模型
-                'input': text,
-            })
+            embedding = await self._client.embeddings.create(
+                model='text-embedding-ada-002',  # 默认嵌入模型
+                input=text,
+            )
 
             return GoogleEmbedContentResponse(embeddings=[{
                 'values': embedding.data[0].embedding,
@@ -657,15 +762,21 @@ class OpenAIContentGenerator(ContentGenerator):
         if not parameters or not isinstance(parameters, dict):
             return parameters
 
-        # 深拷贝参数以避免修改原始数据
-        converted = json.loads(json.dumps(parameters))
-
+        # convert_types 总是构建新的容器、不修改原始数据，因此无需事先深拷贝；
+        # 无需转换的叶子节点（不含待转换键、也没有嵌套容器）直接复用原对象
         def convert_types(obj: Any) -> Any:
             if not isinstance(obj, dict) or obj is None:
                 if isinstance(obj, list):
+                    if not any(isinstance(item, (dict, list)) for item in obj):
+                        return obj
                     return [convert_types(item) for item in obj]
                 return obj
 
+            if _SCHEMA_CONVERTED_KEYS.isdisjoint(obj) and not any(
+                isinstance(value, (dict, list)) for value in obj.values()
+            ):
+                return obj
+
             result: Dict[str, Any] = {}
             for key, value in obj.items():
                 if key == 'type' and isinstance(value, str):
@@ -689,15 +800,13 @@ class OpenAIContentGenerator(ContentGenerator):
                         result[key] = int(value)
                     else:
                         result[key] = value
-                elif isinstance(value, dict):
+                elif isinstance(value, (dict, list)):
                     result[key] = convert_types(value)
-                elif isinstance(value, list):
-                    result[key] = [convert_types(item) for item in value]
                 else:
                     result[key] = value
             return result
 
-        return convert_types(converted) if converted else None
+        return convert_types(parameters)
 
     async def __convert_gemini_tools_to_openai(
         self, 
@@ -719,22 +828,38 @@ class OpenAIContentGenerator(ContentGenerator):
                 # 这已经是一个Tool
                 actual_tool = tool
 
-            if hasattr(actual_tool, 'function_declarations') and actual_tool.function_declarations:
-                for func in actual_tool.function_declarations:
-                    if hasattr(func, 'name') and func.name and hasattr(func, 'description') and func.description:
-                        openai_tools.append({
-                            'type': 'function',
-                            'function': {
-                                'name': func.name,
-                                'description': func.description,
-                                'parameters': self.__convert_gemini_parameters_to_openai(
-                                    getattr(func, 'parameters', {}) if hasattr(func, 'parameters') else {}
-                                ),
-                            },
-                        })
+            openai_tools.extend(self.__convert_gemini_tool_to_openai(actual_tool))
 
         return openai_tools
 
+    def __convert_gemini_tool_to_openai(self, tool: Tool) -> List[Dict[str, Any]]:
+        """转换单个 Tool 的函数声明；同一 Tool 对象在会话中反复传入，结果按对象缓存"""
+        cache = self.__tool_schema_cache
+        cached = cache.get(id(tool))
+        if cached is not None and cached[0] is tool:
+            cache.move_to_end(id(tool))
+            return cached[1]
+
+        converted: List[Dict[str, Any]] = []
+        if hasattr(tool, 'function_declarations') and tool.function_declarations:
+            for func in tool.function_declarations:
+                if hasattr(func, 'name') and func.name and hasattr(func, 'description') and func.description:
+                    converted.append({
+                        'type': 'function',
+                        'function': {
+                            'name': func.name,
+                            'description': func.description,
+                            'parameters': self.__convert_gemini_parameters_to_openai(
+                                getattr(func, 'parameters', {}) if hasattr(func, 'parameters') else {}
+                            ),
+                        },
+                    })
+
+        cache[id(tool)] = (tool, converted)
+        if len(cache) > _TOOL_SCHEMA_CACHE_SIZE:
+            cache.popitem(last=False)
+        return converted
+
     def __convert_to_openai_format(
         self, 
         request: GenerateContentParameters
@@ -747,14 +872,7 @@ class OpenAIContentGenerator(ContentGenerator):
             system_text = ''
 
             if isinstance(system_instruction, list):
-                system_text = '\n'.join([
-                    content if isinstance(content, str) else 
-                    '\n'.join([
-                        p if isinstance(p, str) else getattr(p, 'text', '')
-                        for p in getattr(content, 'parts', [])
-                    ]) if hasattr(content, 'parts') else ''
-                    for content in system_instruction
-                ])
+                system_text = '\n'.join(_iter_text(system_instruction))
             elif isinstance(system_instruction, str):
                 system_text = system_instruction
             elif isinstance(system_instruction, dict) and 'parts' in system_instruction:
@@ -826,10 +944,7 @@ class OpenAIContentGenerator(ContentGenerator):
             elif hasattr(request.contents, 'role') and hasattr(request.contents, 'parts'):
                 content = request.contents
                 role = 'assistant' if getattr(content, 'role', '') == 'model' else 'user'
-                text = '\n'.join([
-                    p if isinstance(p, str) else getattr(p, 'text', '')
-                    for p in getattr(content, 'parts', [])
-                ])
+                text = '\n'.join(_iter_text(content))
                 messages.append({'role': role, 'content': text})
 
         # 清理孤立的工具调用并合并连续的助手消息
@@ -1015,7 +1130,7 @@ class OpenAIContentGenerator(ContentGenerator):
             },
         ]
 
-        response.model_version = self.model
+        response.model_version = self.__model
         response.prompt_feedback = {'safetyRatings': []}
 
         # 如果可用，添加使用元数据
@@ -1048,8 +1163,8 @@ class OpenAIContentGenerator(ContentGenerator):
 
     def __convert_stream_chunk_to_gemini_format(
         self, 
-        chunk: openai.types.chat.ChatCompletionChunk  # OpenAI.Chat.ChatCompletionChunk
-
+        chunk: openai.types.chat.ChatCompletionChunk,  # OpenAI.Chat.ChatCompletionChunk
+        streaming_tool_calls: Dict[int, Dict[str, Any]],
     ) -> GoogleGenerateContentResponse:
         choice = chunk.choices[0] if hasattr(chunk, 'choices') and chunk.choices else None
         response = GoogleGenerateContentResponse()
@@ -1067,9 +1182,9 @@ class OpenAIContentGenerator(ContentGenerator):
                     index = getattr(tool_call, 'index', 0)
 
                     # 获取或创建此索引的工具调用累加器
-                    if index not in self.streaming_tool_calls:
-                        self.streaming_tool_calls[index] = {'arguments': ''}
-                    accumulated_call = self.streaming_tool_calls[index]
+                    if index not in streaming_tool_calls:
+                        streaming_tool_calls[index] = {'arguments': []}
+                    accumulated_call = streaming_tool_calls[index]
 
                     # 更新累积的数据
                     if hasattr(tool_call, 'id') and tool_call.id:
@@ -1077,17 +1192,17 @@ class OpenAIContentGenerator(ContentGenerator):
                     if hasattr(tool_call, 'function') and hasattr(tool_call.function, 'name') and tool_call.function.name:
                         accumulated_call['name'] = tool_call.function.name
                     if hasattr(tool_call, 'function') and hasattr(tool_call.function, 'arguments') and tool_call.function.arguments:
-                        accumulated_call['arguments'] += tool_call.function.arguments
+                        accumulated_call['arguments'].append(tool_call.function.arguments)
 
             # 仅在流式传输完成时发出函数调用（存在finish_reason）
             if hasattr(choice, 'finish_reason') and choice.finish_reason:
-                for accumulated_call in self.streaming_tool_calls.values():
+                for accumulated_call in streaming_tool_calls.values():
                     # TODO: 一旦我们有一种从VLLM解析器生成tool_call_id的方法，就添加回id。
                     if accumulated_call.get('name'):
                         args: Dict[str, Any] = {}
                         if accumulated_call.get('arguments'):
                             try:
-                                args = json.loads(accumulated_call['arguments'])
+                                args = json.loads(''.join(accumulated_call['arguments']))
                             except Exception as error:
                                 print(f"解析最终工具调用参数失败: {error}")
 
@@ -1099,7 +1214,7 @@ class OpenAIContentGenerator(ContentGenerator):
                             },
                         })
                 # 清除所有累积的工具调用
-                self.streaming_tool_calls.clear()
+                streaming_tool_calls.clear()
 
             response.candidates = [
                 {
@@ -1160,8 +1275,9 @@ class OpenAIContentGenerator(ContentGenerator):
         request: GenerateContentParameters
     ) -> Dict[str, Any]:
         config_sampling_params = None
-        if self.config.get_content_generator_config():
-            config_sampling_params = self.__config.get_content_generator_config().sampling_params
+        content_generator_config = self.__config.get_content_generator_config()
+        if content_generator_config:
+            config_sampling_params = content_generator_config.samplingParams
 
         params = {
             # 温度：配置 > 请求 > 默认
@@ -1230,14 +1346,7 @@ class OpenAIContentGenerator(ContentGenerator):
             system_text = ''
 
             if isinstance(system_instruction, list):
-                system_text = '\n'.join([
-                    content if isinstance(content, str) else 
-                    '\n'.join([
-                        p if isinstance(p, str) else getattr(p, 'text', '')
-                        for p in getattr(content, 'parts', [])
-                    ]) if hasattr(content, 'parts') else ''
-                    for content in system_instruction
-                ])
+                system_text = '\n'.join(_iter_text(system_instruction))
             elif isinstance(system_instruction, str):
                 system_text = system_instruction
             elif isinstance(system_instruction, dict) and 'parts' in system_instruction:
@@ -1308,10 +1417,7 @@ class OpenAIContentGenerator(ContentGenerator):
             elif hasattr(request.contents, 'role') and hasattr(request.contents, 'parts'):
                 content = request.contents
                 role = 'assistant' if getattr(content, 'role', '') == 'model' else 'user'
-                text = '\n'.join([
-                    p if isinstance(p, str) else getattr(p, 'text', '')
-                    for p in getattr(content, 'parts', [])
-                ])
+                text = '\n'.join(_iter_text(content))
                 messages.append({'role': role, 'content': text})
 
         # 清理孤立的工具调用并合并连续的助手消息
@@ -1511,7 +1617,7 @@ class OpenAIContentGenerator(ContentGenerator):
             'id': response.response_id or f'chatcmpl-{int(datetime.now().timestamp())}',
             'object': 'chat.completion',
             'created': int(response.create_time) if hasattr(response, 'create_time') and response.create_time else int(datetime.now().timestamp()),
-            'model': self.model,
+            'model': self.__model,
             'choices': [choice],
         }
 
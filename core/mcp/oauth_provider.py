@@ -2,6 +2,7 @@ import asyncio
 import base64
 import hashlib
 import json
+import logging
 import os
 import random
 import string
@@ -17,6 +18,8 @@ from .oauth_token_storage import MCPOAuthToken, MCPOAuthTokenStorage
 from ..utils.errors import get_error_message
 from .oauth_utils import OAuthUtils
 
+logger = logging.getLogger(__name__)
+
 
 class MCPOAuthConfig:
     """OAuth configuration for an MCP server."""
@@ -38,6 +41,13 @@ class MCPOAuthConfig:
         self.redirect_uri = redirect_uri
         self.token_param_name = token_param_name
 
+    @property
+    def scope_str(self) -> str:
+        """Space-separated scope string."""
+        # Built on each access: it is only needed a few times per flow, and
+        # caching it would go stale if scopes were modified in place
+        return ' '.join(self.scopes)
+
 
 class OAuthAuthorizationResponse:
     """OAuth authorization response."""
@@ -113,26 +123,55 @@ class PKCEParams:
         self.state = state
 
 
+class OAuthCallbackState:
+    """Per-authentication callback state shared between the handler and the waiter."""
+    def __init__(self, expected_state: str):
+        self.expected_state = expected_state
+        self.result: Optional[Union[OAuthAuthorizationResponse, Exception]] = None
+        self.event = asyncio.Event()
+
+    def resolve(self, result: Union[OAuthAuthorizationResponse, Exception]) -> None:
+        if not self.event.is_set():
+            self.result = result
+            self.event.set()
+
+
 class OAuthCallbackHandler(BaseHTTPRequestHandler):
-    """Handler for OAuth callback requests."""
-    expected_state = None
-    callback_result = None
-    callback_event = None
+    """Handler for OAuth callback requests.
+
+    Use :meth:`bind` to get a handler class tied to a single authentication
+    flow, so concurrent flows never share state.
+    """
+    callback_state: Optional[OAuthCallbackState] = None
+
+    @classmethod
+    def bind(cls, callback_state: OAuthCallbackState) -> type:
+        return type('BoundOAuthCallbackHandler', (cls,), {'callback_state': callback_state})
 
     def do_GET(self):
         try:
-            parsed_url = urllib.parse.urlparse(self.path)
-            query_params = urllib.parse.parse_qs(parsed_url.query)
-            path = parsed_url.path
+            # 回调的形状固定，只需取出少量标量参数，无需 urlparse/parse_qs
+            path, _, query = self.path.partition('?')
+            path = path.split('#', 1)[0]
 
             if path != MCPOAuthProvider.REDIRECT_PATH:
                 self.send_error(404, "Not found")
                 return
 
-            code = query_params.get('code', [None])[0]
-            state = query_params.get('state', [None])[0]
-            error = query_params.get('error', [None])[0]
-            error_description = query_params.get('error_description', [''])[0]
+            query_params: Dict[str, str] = {}
+            for pair in query.split('#', 1)[0].split('&'):
+                if not pair:
+                    continue
+                key, _, value = pair.partition('=')
+                key = urllib.parse.unquote_plus(key)
+                # 与 parse_qs 保持一致：重复参数取第一个值
+                if key not in query_params:
+                    query_params[key] = urllib.parse.unquote_plus(value)
+
+            code = query_params.get('code') or None
+            state = query_params.get('state') or None
+            error = query_params.get('error') or None
+            error_description = query_params.get('error_description', '')
 
             if error:
                 self.send_response(200)
@@ -149,20 +188,18 @@ class OAuthCallbackHandler(BaseHTTPRequestHandler):
                 </html>
                 """
                 self.wfile.write(error_html.encode('utf-8'))
-                if self.callback_event:
-                    self.callback_result = Exception(f"OAuth error: {error}")
-                    self.callback_event.set()
+                if self.callback_state:
+                    self.callback_state.resolve(Exception(f"OAuth error: {error}"))
                 return
 
             if not code or not state:
                 self.send_error(400, "Missing code or state parameter")
                 return
 
-            if state != self.expected_state:
+            if not self.callback_state or state != self.callback_state.expected_state:
                 self.send_error(400, "Invalid state parameter")
-                if self.callback_event:
-                    self.callback_result = Exception("State mismatch - possible CSRF attack")
-                    self.callback_event.set()
+                if self.callback_state:
+                    self.callback_state.resolve(Exception("State mismatch - possible CSRF attack"))
                 return
 
             # Send success response to browser
@@ -180,14 +217,11 @@ class OAuthCallbackHandler(BaseHTTPRequestHandler):
             """
             self.wfile.write(success_html.encode('utf-8'))
 
-            if self.callback_event:
-                self.callback_result = OAuthAuthorizationResponse(code, state)
-                self.callback_event.set()
+            self.callback_state.resolve(OAuthAuthorizationResponse(code, state))
 
         except Exception as e:
-            if self.callback_event:
-                self.callback_result = e
-                self.callback_event.set()
+            if self.callback_state:
+                self.callback_state.resolve(e)
 
 
 class MCPOAuthProvider:
@@ -196,23 +230,45 @@ class MCPOAuthProvider:
     REDIRECT_PATH = '/oauth/callback'
     HTTP_OK = 200
     HTTP_REDIRECT = 302
+    # 正在进行的认证流程数，最后一个流程结束时关闭 OAuthUtils 的共享 HTTP 会话
+    _active_flows = 0
+
+    @staticmethod
+    def get_redirect_uri(
+            config: MCPOAuthConfig, 
+            redirect_port: Optional[int] = None) -> str:
+        """
+        Get the redirect URI for an OAuth flow.
+
+        Args:
+            config: OAuth configuration
+            redirect_port: The port the callback server is bound to
+
+        Returns:
+            The configured redirect URI, or the local callback URI
+        """
+        if config.redirect_uri:
+            return config.redirect_uri
+        port = redirect_port or MCPOAuthProvider.REDIRECT_PORT
+        return f"http://localhost:{port}{MCPOAuthProvider.REDIRECT_PATH}"
 
     @staticmethod
     async def register_client(
             registration_url: str, 
-            config: MCPOAuthConfig) -> OAuthClientRegistrationResponse:
+            config: MCPOAuthConfig, 
+            redirect_port: Optional[int] = None) -> OAuthClientRegistrationResponse:
         """
         Register a client dynamically with the OAuth server.
 
         Args:
             registration_url: The client registration endpoint URL
             config: OAuth configuration
+            redirect_port: The port the callback server is bound to
 
         Returns:
             The registered client information
         """
-        redirect_uri = config.redirect_uri or \
-            f"http://localhost:{MCPOAuthProvider.REDIRECT_PORT}{MCPOAuthProvider.REDIRECT_PATH}"
+        redirect_uri = MCPOAuthProvider.get_redirect_uri(config, redirect_port)
 
         registration_request = OAuthClientRegistrationRequest(
             client_name='Gemini CLI (Google ADC)',
@@ -221,7 +277,7 @@ class MCPOAuthProvider:
             response_types=['code'],
             token_endpoint_auth_method='none',  # Public client
             code_challenge_method=['S256'],
-            scope=' '.join(config.scopes) if config.scopes else ''
+            scope=config.scope_str
         )
 
         # 转换为字典以便JSON序列化
@@ -306,65 +362,99 @@ class MCPOAuthProvider:
         return PKCEParams(code_verifier, code_challenge, state)
 
     @staticmethod
-    async def start_callback_server(
-            expected_state: str) -> OAuthAuthorizationResponse:
+    def create_callback_server(
+            expected_state: str, 
+            port: Optional[int] = None) -> Tuple[HTTPServer, OAuthCallbackState]:
         """
-        Start a local HTTP server to handle OAuth callback.
+        Bind a local HTTP server for a single OAuth callback.
 
         Args:
             expected_state: The state parameter to validate
+            port: The port to listen on; 0 lets the OS pick a free port
 
         Returns:
-            Promise that resolves with the authorization code
+            The bound server and the callback state it reports into
         """
-        event = asyncio.Event()
-        OAuthCallbackHandler.expected_state = expected_state
-        OAuthCallbackHandler.callback_result = None
-        OAuthCallbackHandler.callback_event = event
-
-        server = HTTPServer(('localhost', MCPOAuthProvider.REDIRECT_PORT), OAuthCallbackHandler)
+        if port is None:
+            port = MCPOAuthProvider.REDIRECT_PORT
+        callback_state = OAuthCallbackState(expected_state)
+        server = HTTPServer(('localhost', port), OAuthCallbackHandler.bind(callback_state))
         server.timeout = 1  # 设置超时以便定期检查event
+        return server, callback_state
+
+    @staticmethod
+    async def wait_for_callback(
+            server: HTTPServer, 
+            callback_state: OAuthCallbackState) -> OAuthAuthorizationResponse:
+        """
+        Serve requests on a bound callback server until the callback arrives.
+
+        Args:
+            server: Server returned by create_callback_server
+            callback_state: Callback state returned by create_callback_server
 
-        print(f"OAuth callback server listening on port {MCPOAuthProvider.REDIRECT_PORT}")
+        Returns:
+            The authorization response
+        """
+        event = callback_state.event
+
+        print(f"OAuth callback server listening on port {server.server_address[1]}")
 
         # 创建一个任务来运行服务器
         async def serve_forever():
             while not event.is_set():
                 server.handle_request()
                 await asyncio.sleep(0.1)  # 短暂睡眠以避免CPU占用过高
-            server.server_close()
 
         # 创建超时任务
         async def timeout():
             await asyncio.sleep(5 * 60)  # 5分钟超时
-            if not event.is_set():
-                event.set()
-                OAuthCallbackHandler.callback_result = Exception("OAuth callback timeout")
+            callback_state.resolve(Exception("OAuth callback timeout"))
 
         # 运行服务器和超时任务
         server_task = asyncio.create_task(serve_forever())
         timeout_task = asyncio.create_task(timeout())
 
-        # 等待事件设置或超时
-        await event.wait()
-
-        # 取消任务
-        server_task.cancel()
-        timeout_task.cancel()
+        try:
+            # 等待事件设置或超时
+            await event.wait()
+        finally:
+            # 取消任务
+            server_task.cancel()
+            timeout_task.cancel()
+            server.server_close()
 
         # 检查结果
-        if isinstance(OAuthCallbackHandler.callback_result, Exception):
-            raise OAuthCallbackHandler.callback_result
-        elif OAuthCallbackHandler.callback_result:
-            return OAuthCallbackHandler.callback_result
+        if isinstance(callback_state.result, Exception):
+            raise callback_state.result
+        elif callback_state.result:
+            return callback_state.result
         else:
             raise Exception("Unknown error in OAuth callback")
 
+    @staticmethod
+    async def start_callback_server(
+            expected_state: str, 
+            port: Optional[int] = None) -> OAuthAuthorizationResponse:
+        """
+        Start a local HTTP server to handle OAuth callback.
+
+        Args:
+            expected_state: The state parameter to validate
+            port: The port to listen on; 0 lets the OS pick a free port
+
+        Returns:
+            Promise that resolves with the authorization code
+        """
+        server, callback_state = MCPOAuthProvider.create_callback_server(expected_state, port)
+        return await MCPOAuthProvider.wait_for_callback(server, callback_state)
+
     @staticmethod
     def build_authorization_url(
             config: MCPOAuthConfig, 
             pkce_params: PKCEParams, 
-            mcp_server_url: Optional[str] = None) -> str:
+            mcp_server_url: Optional[str] = None, 
+            redirect_port: Optional[int] = None) -> str:
         """
         Build the authorization URL with PKCE parameters.
 
@@ -372,12 +462,12 @@ class MCPOAuthProvider:
             config: OAuth configuration
             pkce_params: PKCE parameters
             mcp_server_url: The MCP server URL to use as the resource parameter
+            redirect_port: The port the callback server is bound to
 
         Returns:
             The authorization URL
         """
-        redirect_uri = config.redirect_uri or \
-            f"http://localhost:{MCPOAuthProvider.REDIRECT_PORT}{MCPOAuthProvider.REDIRECT_PATH}"
+        redirect_uri = MCPOAuthProvider.get_redirect_uri(config, redirect_port)
 
         params = urllib.parse.urlencode({
             'client_id': config.client_id,
@@ -388,8 +478,8 @@ class MCPOAuthProvider:
             'code_challenge_method': 'S256'
         })
 
-        if config.scopes and len(config.scopes) > 0:
-            scope_param = urllib.parse.urlencode({'scope': ' '.join(config.scopes)})
+        if config.scope_str:
+            scope_param = urllib.parse.urlencode({'scope': config.scope_str})
             params += '&' + scope_param
 
         # Add resource parameter for MCP OAuth spec compliance
@@ -410,7 +500,8 @@ class MCPOAuthProvider:
             config: MCPOAuthConfig, 
             code: str, 
             code_verifier: str, 
-            mcp_server_url: Optional[str] = None) -> OAuthTokenResponse:
+            mcp_server_url: Optional[str] = None, 
+            redirect_port: Optional[int] = None) -> OAuthTokenResponse:
         """
         Exchange authorization code for tokens.
 
@@ -419,12 +510,12 @@ class MCPOAuthProvider:
             code: Authorization code
             code_verifier: PKCE code verifier
             mcp_server_url: The MCP server URL to use as the resource parameter
+            redirect_port: The port the callback server was bound to
 
         Returns:
             The token response
         """
-        redirect_uri = config.redirect_uri or \
-            f"http://localhost:{MCPOAuthProvider.REDIRECT_PORT}{MCPOAuthProvider.REDIRECT_PATH}"
+        redirect_uri = MCPOAuthProvider.get_redirect_uri(config, redirect_port)
 
         params = {
             'grant_type': 'authorization_code',
@@ -491,8 +582,8 @@ class MCPOAuthProvider:
         if config.client_secret:
             params['client_secret'] = config.client_secret
 
-        if config.scopes and len(config.scopes) > 0:
-            params['scope'] = ' '.join(config.scopes)
+        if config.scope_str:
+            params['scope'] = config.scope_str
 
         # Add resource parameter for MCP OAuth spec compliance
         # Use the MCP server URL if provided, otherwise fall back to token URL
@@ -525,7 +616,8 @@ class MCPOAuthProvider:
     async def authenticate(
             server_name: str, 
             config: MCPOAuthConfig, 
-            mcp_server_url: Optional[str] = None) -> MCPOAuthToken:
+            mcp_server_url: Optional[str] = None, 
+            redirect_port: Optional[int] = None) -> MCPOAuthToken:
         """
         Perform the full OAuth authorization code flow with PKCE.
 
@@ -533,10 +625,29 @@ class MCPOAuthProvider:
             server_name: The name of the MCP server
             config: OAuth configuration
             mcp_server_url: Optional MCP server URL for OAuth discovery
+            redirect_port: Port for the local callback server; 0 lets the OS
+                pick a free port so several flows can run in parallel
 
         Returns:
             The obtained OAuth token
         """
+        MCPOAuthProvider._active_flows += 1
+        try:
+            return await MCPOAuthProvider._authenticate(
+                server_name, config, mcp_server_url, redirect_port
+            )
+        finally:
+            MCPOAuthProvider._active_flows -= 1
+            if not MCPOAuthProvider._active_flows:
+                await OAuthUtils.close()
+
+    @staticmethod
+    async def _authenticate(
+            server_name: str, 
+            config: MCPOAuthConfig, 
+            mcp_server_url: Optional[str], 
+            redirect_port: Optional[int]) -> MCPOAuthToken:
+        """Run the authorization code flow; see authenticate()."""
         # If no authorization URL is provided, try to discover OAuth configuration
         if not config.authorization_url and mcp_server_url:
             print('No authorization URL provided, attempting OAuth discovery...')
@@ -588,93 +699,103 @@ class MCPOAuthProvider:
                 else:
                     raise Exception('Failed to discover OAuth configuration from MCP server')
 
-        # If no client ID is provided, try dynamic client registration
-        if not config.client_id:
-            # Extract server URL from authorization URL
-            if not config.authorization_url:
-                raise Exception('Cannot perform dynamic registration without authorization URL')
+        # Generate PKCE parameters
+        pkce_params = MCPOAuthProvider.generate_pkce_params()
+
+        # Bind the callback server up front so the redirect URI carries the
+        # actual port (REDIRECT_PORT by default, or an OS-assigned one)
+        server, callback_state = MCPOAuthProvider.create_callback_server(
+            pkce_params.state, redirect_port
+        )
+        bound_port = server.server_address[1]
 
-            parsed_url = urllib.parse.urlparse(config.authorization_url)
-            server_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
+        try:
+            # If no client ID is provided, try dynamic client registration
+            if not config.client_id:
+                # Extract server URL from authorization URL
+                if not config.authorization_url:
+                    raise Exception('Cannot perform dynamic registration without authorization URL')
 
-            print('No client ID provided, attempting dynamic client registration...')
+                parsed_url = urllib.parse.urlparse(config.authorization_url)
+                server_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
 
-            # Get the authorization server metadata for registration
-            auth_server_metadata_url = urllib.parse.urljoin(
-                server_url, '/.well-known/oauth-authorization-server')
+                print('No client ID provided, attempting dynamic client registration...')
 
-            auth_server_metadata = await OAuthUtils.fetch_authorization_server_metadata(
-                auth_server_metadata_url
-            )
-            if not auth_server_metadata:
-                raise Exception('Failed to fetch authorization server metadata for client registration')
-
-            # Register client if registration endpoint is available
-            if auth_server_metadata.get('registration_endpoint'):
-                client_registration = await MCPOAuthProvider.register_client(
-                    auth_server_metadata['registration_endpoint'],
-                    config
+                # Get the authorization server metadata for registration
+                auth_server_metadata_url = urllib.parse.urljoin(
+                    server_url, '/.well-known/oauth-authorization-server')
+
+                auth_server_metadata = await OAuthUtils.fetch_authorization_server_metadata(
+                    auth_server_metadata_url
                 )
+                if not auth_server_metadata:
+                    raise Exception('Failed to fetch authorization server metadata for client registration')
+
+                # Register client if registration endpoint is available
+                if auth_server_metadata.get('registration_endpoint'):
+                    client_registration = await MCPOAuthProvider.register_client(
+                        auth_server_metadata['registration_endpoint'],
+                        config,
+                        bound_port
+                    )
 
-                config.client_id = client_registration.client_id
-                if client_registration.client_secret:
-                    config.client_secret = client_registration.client_secret
+                    config.client_id = client_registration.client_id
+                    if client_registration.client_secret:
+                        config.client_secret = client_registration.client_secret
 
-                print('Dynamic client registration successful')
-            else:
-                raise Exception('No client ID provided and dynamic registration not supported')
+                    print('Dynamic client registration successful')
+                else:
+                    raise Exception('No client ID provided and dynamic registration not supported')
 
-        # Validate configuration
-        if not config.client_id or not config.authorization_url or not config.token_url:
-            raise Exception('Missing required OAuth configuration after discovery and registration')
+            # Validate configuration
+            if not config.client_id or not config.authorization_url or not config.token_url:
+                raise Exception('Missing required OAuth configuration after discovery and registration')
 
-        # Generate PKCE parameters
-        pkce_params = MCPOAuthProvider.generate_pkce_params()
+            # Build authorization URL
+            auth_url = MCPOAuthProvider.build_authorization_url(
+                config, pkce_params, mcp_server_url, bound_port
+            )
 
-        # Build authorization URL
-        auth_url = MCPOAuthProvider.build_authorization_url(
-            config, pkce_params, mcp_server_url
-        )
+            print('\nOpening browser for OAuth authentication...')
+            print('If the browser does not open, please visit:')
+            print('')
 
-        print('\nOpening browser for OAuth authentication...')
-        print('If the browser does not open, please visit:')
-        print('')
+            # Get terminal width or default to 80
+            try:
+                terminal_width = os.get_terminal_size().columns
+            except OSError:
+                terminal_width = 80
+            separator_length = min(terminal_width - 2, 80)
+            separator = '━' * separator_length
+
+            print(separator)
+            print('COPY THE ENTIRE URL BELOW (select all text between the lines):')
+            print(separator)
+            print(auth_url)
+            print(separator)
+            print('')
+            print('💡 TIP: Triple-click to select the entire URL, then copy and paste it into your browser.')
+            print('⚠️  Make sure to copy the COMPLETE URL - it may wrap across multiple lines.')
+            print('')
+
+            # Open browser securely
+            try:
+                await open_browser_securely(auth_url)
+            except Exception as e:
+                print(f"Warning: {get_error_message(e)}")
 
-        # Get terminal width or default to 80
-        try:
-            terminal_width = os.get_terminal_size().columns
-        except OSError:
-            terminal_width = 80
-        separator_length = min(terminal_width - 2, 80)
-        separator = '━' * separator_length
-
-        print(separator)
-        print('COPY THE ENTIRE URL BELOW (select all text between the lines):')
-        print(separator)
-        print(auth_url)
-        print(separator)
-        print('')
-        print('💡 TIP: Triple-click to select the entire URL, then copy and paste it into your browser.')
-        print('⚠️  Make sure to copy the COMPLETE URL - it may wrap across multiple lines.')
-        print('')
-
-        # Start callback server
-        callback_promise = MCPOAuthProvider.start_callback_server(pkce_params.state)
-
-        # Open browser securely
-        try:
-            await open_browser_securely(auth_url)
-        except Exception as e:
-            print(f"Warning: {get_error_message(e)}")
+        except BaseException:
+            server.server_close()
+            raise
 
         # Wait for callback
-        authorization_response = await callback_promise
+        authorization_response = await MCPOAuthProvider.wait_for_callback(server, callback_state)
 
         print('\nAuthorization code received, exchanging for tokens...')
 
         # Exchange code for tokens
         token_response = await MCPOAuthProvider.exchange_code_for_token(
-            config, authorization_response.code, pkce_params.code_verifier, mcp_server_url
+            config, authorization_response.code, pkce_params.code_verifier, mcp_server_url, bound_port
         )
 
         # Convert to our token format
@@ -698,9 +819,9 @@ class MCPOAuthProvider:
             # Verify token was saved
             saved_token = await MCPOAuthTokenStorage.get_token(server_name)
             if saved_token:
-                print(f'Token verification successful: {saved_token.token.access_token[:20]}...')
+                logger.debug('Token verification successful: %s...', saved_token.token.access_token[:20])
             else:
-                print('Token verification failed: token not found after save')
+                logger.debug('Token verification failed: token not found after save')
         except Exception as save_error:
             print(f'Failed to save token: {get_error_message(save_error)}')
             raise save_error
@@ -721,22 +842,22 @@ class MCPOAuthProvider:
         Returns:
             A valid access token or None if not authenticated
         """
-        print(f"Debug: Getting valid token for server: {server_name}")
+        logger.debug("Getting valid token for server: %s", server_name)
         credentials = await MCPOAuthTokenStorage.get_token(server_name)
 
         if not credentials:
-            print(f"Debug: No credentials found for server: {server_name}")
+            logger.debug("No credentials found for server: %s", server_name)
             return None
 
         token = credentials.token
-        is_expired = MCPOAuthTokenStorage.is_token_expired(token)
-        print(f"Debug: Found token for server: {server_name}, expired: {is_expired}")
 
         # Check if token is expired
-        if not is_expired:
-            print(f"Debug: Returning valid token for server: {server_name}")
+        if not MCPOAuthTokenStorage.is_token_expired(token):
+            logger.debug("Returning valid token for server: %s", server_name)
             return token.access_token
 
+        logger.debug("Token for server %s is expired", server_name)
+
         # Try to refresh if we have a refresh token
         if token.refresh_token and config.client_id and credentials.token_url:
             try:
@@ -1,22 +1,20 @@
+import asyncio
+import contextlib
 import os
 import json
 import time
+from dataclasses import dataclass, field
 from typing import Dict, Optional, Any
 
 
+@dataclass(slots=True)
 class MCPOAuthToken:
     """MCP OAuth 令牌接口"""
-    def __init__(self, 
-                 access_token: str, 
-                 token_type: str, 
-                 refresh_token: Optional[str] = None, 
-                 expires_at: Optional[int] = None, 
-                 scope: Optional[str] = None):
-        self.access_token = access_token
-        self.refresh_token = refresh_token
-        self.expires_at = expires_at
-        self.token_type = token_type
-        self.scope = scope
+    access_token: str
+    token_type: str
+    refresh_token: Optional[str] = None
+    expires_at: Optional[int] = None
+    scope: Optional[str] = None
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式以便序列化"""
@@ -44,21 +42,18 @@ class MCPOAuthToken:
         )
 
 
+@dataclass(slots=True)
 class MCPOAuthCredentials:
     """存储的 MCP OAuth 凭证接口"""
-    def __init__(self, 
-                 server_name: str, 
-                 token: MCPOAuthToken, 
-                 updated_at: int, 
-                 client_id: Optional[str] = None,
-                 token_url: Optional[str] = None,
-                 mcp_server_url: Optional[str] = None):
-        self.server_name = server_name
-        self.token = token
-        self.client_id = client_id
-        self.token_url = token_url
-        self.mcp_server_url = mcp_server_url
-        self.updated_at = updated_at
+    server_name: str
+    token: MCPOAuthToken
+    updated_at: int
+    client_id: Optional[str] = None
+    token_url: Optional[str] = None
+    mcp_server_url: Optional[str] = None
+    # 凭证保存后不再修改，缓存其序列化形式供写文件时复用
+    _dict_cache: Optional[Dict[str, Any]] = field(
+        default=None, init=False, repr=False, compare=False)
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式以便序列化"""
@@ -87,11 +82,32 @@ class MCPOAuthCredentials:
             updated_at=data['updatedAt']
         )
 
+    def cached_dict(self) -> Dict[str, Any]:
+        """返回缓存的序列化字典（调用方不得修改）"""
+        cached = self._dict_cache
+        if cached is None:
+            cached = self._dict_cache = self.to_dict()
+        return cached
+
 
 class MCPOAuthTokenStorage:
     """管理 MCP OAuth 令牌存储和检索的类"""
     _TOKEN_FILE = 'mcp-oauth-tokens.json'
     _CONFIG_DIR = '.gemini'
+    # 5 分钟的缓冲时间（毫秒），用于应对时钟偏差
+    _BUFFER_MS = 5 * 60 * 1000
+
+    # 进程内权威令牌映射，以文件的 mtime_ns 检测外部修改
+    _cache: Optional[Dict[str, MCPOAuthCredentials]] = None
+    _cache_mtime_ns: int = -1
+    _write_lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def _get_write_lock(cls) -> asyncio.Lock:
+        """获取用于串行化写操作的锁"""
+        if cls._write_lock is None:
+            cls._write_lock = asyncio.Lock()
+        return cls._write_lock
 
     @classmethod
     def _get_token_file_path(cls) -> str:
@@ -104,31 +120,85 @@ class MCPOAuthTokenStorage:
         """确保配置目录存在"""
         config_dir = os.path.dirname(cls._get_token_file_path())
         if not os.path.exists(config_dir):
-            os.makedirs(config_dir, exist_ok=True)
+            await asyncio.to_thread(os.makedirs, config_dir, exist_ok=True)
 
-    @classmethod
-    async def load_tokens(cls) -> Dict[str, MCPOAuthCredentials]:
-        """加载所有存储的 MCP OAuth 令牌"""
+    @staticmethod
+    def _read_token_file(token_file: str) -> Dict[str, MCPOAuthCredentials]:
+        """同步读取并解析令牌文件（在工作线程中运行）"""
         token_map: Dict[str, MCPOAuthCredentials] = {}
+        with open(token_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            tokens = data  # 假设数据是 MCPOAuthCredentials 列表
+
+            for credential_data in tokens:
+                credential = MCPOAuthCredentials.from_dict(credential_data)
+                token_map[credential.server_name] = credential
+        return token_map
+
+    @classmethod
+    async def _get_tokens(cls) -> Dict[str, MCPOAuthCredentials]:
+        """返回内存中的令牌映射（不复制），文件变化时重新加载"""
+        token_file = cls._get_token_file_path()
 
         try:
-            token_file = cls._get_token_file_path()
-            with open(token_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                tokens = data  # 假设数据是 MCPOAuthCredentials 列表
+            mtime_ns = os.stat(token_file).st_mtime_ns
+        except FileNotFoundError:
+            # 文件不存在，使用空映射
+            cls._cache = {}
+            cls._cache_mtime_ns = -1
+            return cls._cache
 
-                for credential_data in tokens:
-                    credential = MCPOAuthCredentials.from_dict(credential_data)
-                    token_map[credential.server_name] = credential
+        # 文件未变化时直接使用内存中的映射
+        if cls._cache is not None and mtime_ns == cls._cache_mtime_ns:
+            return cls._cache
+
+        try:
+            # 在线程中执行文件 I/O，避免阻塞事件循环
+            token_map = await asyncio.to_thread(cls._read_token_file, token_file)
         except FileNotFoundError:
-            # 文件不存在，返回空映射
-            pass
+            # 文件在 stat 之后被删除，使用空映射
+            token_map = {}
+            mtime_ns = -1
         except Exception as e:
-            # 其他错误，记录错误信息
+            # 其他错误，记录错误信息，下次访问时重试
             print(f"Failed to load MCP OAuth tokens: {str(e)}")
+            cls._cache = None
+            return {}
 
+        cls._cache = token_map
+        cls._cache_mtime_ns = mtime_ns
         return token_map
 
+    @classmethod
+    def _atomic_write(cls, tokens: Dict[str, MCPOAuthCredentials]) -> None:
+        """将令牌映射原子地写入文件（写临时文件、fsync 后再替换）"""
+        token_file = cls._get_token_file_path()
+        tmp_file = token_file + '.tmp'
+
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump([cred.cached_dict() for cred in tokens.values()], f)
+                f.flush()
+                os.fsync(f.fileno())
+            # 在替换前设置权限，保证最终文件从不具有更宽的权限
+            os.chmod(tmp_file, 0o600)
+            os.replace(tmp_file, token_file)
+            cls._cache_mtime_ns = os.stat(token_file).st_mtime_ns
+        except Exception:
+            # 清理残留的临时文件；原令牌文件保持完整
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+            # 内存与文件可能不一致，下次访问时从文件重新加载
+            cls._cache = None
+            raise
+
+    @classmethod
+    async def load_tokens(cls) -> Dict[str, MCPOAuthCredentials]:
+        """加载所有存储的 MCP OAuth 令牌"""
+        return dict(await cls._get_tokens())
+
     @classmethod
     async def save_token(cls, 
                         server_name: str, 
@@ -139,8 +209,6 @@ class MCPOAuthTokenStorage:
         """为特定的 MCP 服务器保存令牌"""
         await cls._ensure_config_dir()
 
-        tokens = await cls.load_tokens()
-
         credential = MCPOAuthCredentials(
             server_name=server_name,
             token=token,
@@ -150,67 +218,68 @@ class MCPOAuthTokenStorage:
             updated_at=int(time.time() * 1000)  # 使用毫秒时间戳
         )
 
-        tokens[server_name] = credential
-
-        token_array = list(tokens.values())
-        token_file = cls._get_token_file_path()
+        async with cls._get_write_lock():
+            tokens = await cls._get_tokens()
+            tokens[server_name] = credential
 
-        try:
-            with open(token_file, 'w', encoding='utf-8') as f:
-                json.dump([cred.to_dict() for cred in token_array], f, indent=2)
-            # 设置文件权限为仅当前用户可读写
-            os.chmod(token_file, 0o600)
-        except Exception as e:
-            print(f"Failed to save MCP OAuth token: {str(e)}")
-            raise
+            try:
+                await asyncio.to_thread(cls._atomic_write, tokens)
+            except Exception as e:
+                print(f"Failed to save MCP OAuth token: {str(e)}")
+                raise
 
     @classmethod
     async def get_token(cls, server_name: str) -> Optional[MCPOAuthCredentials]:
         """获取特定 MCP 服务器的令牌"""
-        tokens = await cls.load_tokens()
+        tokens = await cls._get_tokens()
         return tokens.get(server_name)
 
     @classmethod
     async def remove_token(cls, server_name: str) -> None:
         """删除特定 MCP 服务器的令牌"""
-        tokens = await cls.load_tokens()
+        async with cls._get_write_lock():
+            tokens = await cls._get_tokens()
 
-        if server_name in tokens:
-            del tokens[server_name]
-            token_array = list(tokens.values())
+            if server_name not in tokens:
+                return
+
+            # 在副本上修改，文件写入或删除成功后才替换内存映射
+            remaining = {name: cred for name, cred in tokens.items() if name != server_name}
             token_file = cls._get_token_file_path()
 
             try:
-                if len(token_array) == 0:
+                if not remaining:
                     # 如果没有令牌了，删除文件
                     if os.path.exists(token_file):
-                        os.remove(token_file)
+                        await asyncio.to_thread(os.remove, token_file)
+                    cls._cache_mtime_ns = -1
                 else:
-                    with open(token_file, 'w', encoding='utf-8') as f:
-                        json.dump([cred.to_dict() for cred in token_array], f, indent=2)
-                    os.chmod(token_file, 0o600)
+                    await asyncio.to_thread(cls._atomic_write, remaining)
+                cls._cache = remaining
             except Exception as e:
                 print(f"Failed to remove MCP OAuth token: {str(e)}")
 
     @classmethod
     def is_token_expired(cls, token: MCPOAuthToken) -> bool:
-        """检查令牌是否已过期"""
-        if token.expires_at is None:
-            return False  # 没有过期时间，假设有效
-
-        # 添加 5 分钟的缓冲时间以应对时钟偏差
-        buffer_ms = 5 * 60 * 1000
-        return int(time.time() * 1000) + buffer_ms >= token.expires_at
+        """检查令牌是否已过期（没有过期时间则视为有效）"""
+        expires_at = token.expires_at
+        return expires_at is not None and time.time_ns() // 1_000_000 + cls._BUFFER_MS >= expires_at
 
     @classmethod
     async def clear_all_tokens(cls) -> None:
-        """清除所有存储的 MCP OAuth 令牌"""
-        try:
+        """清除所有存储的 MCP OAuth 令牌
+
+        Raises:
+            OSError: 删除令牌文件失败（例如权限不足）时抛出
+        """
+        async with cls._get_write_lock():
             token_file = cls._get_token_file_path()
-            if os.path.exists(token_file):
-                os.remove(token_file)
-        except FileNotFoundError:
-            # 文件不存在，忽略错误
-            pass
-        except Exception as e:
-            print(f"Failed to clear MCP OAuth tokens: {str(e)}")
\ No newline at end of file
+            # 全新安装时文件通常不存在，直接跳过删除
+            if os.path.lexists(token_file):
+                with contextlib.suppress(FileNotFoundError):
+                    await asyncio.to_thread(os.remove, token_file)
+
+            # 仅在文件确实删除后才重置内存状态；删除失败时异常直接抛出，
+            # 内存映射仍与磁盘上的令牌文件保持一致
+            cls._cache = {}
+            cls._cache_mtime_ns = -1
@@ -1,5 +1,9 @@
+import asyncio
+import contextlib
 import re
 import json
+import time
+from functools import lru_cache
 from typing import Dict, List, Optional, Any, Tuple
 import urllib.parse
 import aiohttp
@@ -62,31 +66,112 @@ class OAuthProtectedResourceMetadata():
 
 
 
+_RESOURCE_METADATA_RE = re.compile(r'resource_metadata="([^"]+)"')
+
+
+@lru_cache(maxsize=128)
+def _well_known_urls(base_url: str) -> Tuple[str, str]:
+    parsed_url = urllib.parse.urlparse(base_url)
+    base = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    return (
+        urllib.parse.urljoin(base, '/.well-known/oauth-protected-resource'),
+        urllib.parse.urljoin(base, '/.well-known/oauth-authorization-server')
+    )
+
+
 class OAuthUtils:
     """OAuth 操作的实用工具类"""
+
+    # 元数据缓存：URL -> (获取时间, 元数据)，元数据对同一服务器基本不变
+    METADATA_CACHE_TTL = 3600.0
+    _resource_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+    _auth_server_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    # 共享的 HTTP 会话，跨发现请求复用连接（keep-alive / TLS）
+    _session: Optional[aiohttp.ClientSession] = None
+    _session_loop: Optional[asyncio.AbstractEventLoop] = None
+    _REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+    @classmethod
+    async def _get_session(cls) -> aiohttp.ClientSession:
+        """获取共享的 aiohttp 会话，必要时（首次使用或事件循环变化）重新创建"""
+        loop = asyncio.get_running_loop()
+        if cls._session is None or cls._session.closed or cls._session_loop is not loop:
+            await cls._close_stale_session(cls._session, cls._session_loop)
+            cls._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300)
+            )
+            cls._session_loop = loop
+        return cls._session
+
+    @staticmethod
+    async def _close_stale_session(
+            session: Optional[aiohttp.ClientSession],
+            session_loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """关闭属于其他事件循环的旧会话，避免替换时泄漏"""
+        if session is None or session.closed:
+            return
+        if session_loop is not None and session_loop.is_running():
+            # 旧循环仍在其他线程中运行，交给它自己关闭
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+            return
+        # 旧循环已结束，其连接无法再正常关闭，只尽力释放连接器
+        with contextlib.suppress(RuntimeError):
+            await session.close()
+
+    @classmethod
+    async def close(cls) -> None:
+        """关闭共享的 HTTP 会话"""
+        session = cls._session
+        cls._session = None
+        cls._session_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+
+    @classmethod
+    def _get_cached(cls, cache: Dict[str, Tuple[float, Any]], url: str) -> Optional[Any]:
+        """返回未过期的缓存项"""
+        entry = cache.get(url)
+        if entry is None:
+            return None
+        fetched_at, value = entry
+        if time.monotonic() - fetched_at >= cls.METADATA_CACHE_TTL:
+            del cache[url]
+            return None
+        return value
+
+    @classmethod
+    def clear_metadata_cache(cls) -> None:
+        """清除已缓存的 OAuth 元数据"""
+        cls._resource_cache.clear()
+        cls._auth_server_cache.clear()
     
     @classmethod
     def build_well_known_urls(cls, base_url: str) -> Dict[str, str]:
         """构建 well-known OAuth 端点 URL"""
-        parsed_url = urllib.parse.urlparse(base_url)
-        base = f"{parsed_url.scheme}://{parsed_url.netloc}"
-        
+        protected_resource, authorization_server = _well_known_urls(base_url)
         return {
-            'protectedResource': urllib.parse.urljoin(base, '/.well-known/oauth-protected-resource'),
-            'authorizationServer': urllib.parse.urljoin(base, '/.well-known/oauth-authorization-server')
+            'protectedResource': protected_resource,
+            'authorizationServer': authorization_server
         }
     
     @classmethod
     async def fetch_protected_resource_metadata(
         cls, resource_metadata_url: str
-    ) -> Optional[OAuthProtectedResourceMetadata]:
+    ) -> Optional[Dict[str, Any]]:
         """获取 OAuth 受保护资源元数据"""
+        cached = cls._get_cached(cls._resource_cache, resource_metadata_url)
+        if cached is not None:
+            return cached
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(resource_metadata_url) as response:
-                    if not response.ok:
-                        return None
-                    return await response.json()
+            session = await cls._get_session()
+            async with session.get(resource_metadata_url, timeout=cls._REQUEST_TIMEOUT) as response:
+                if not response.ok:
+                    return None
+                metadata = await response.json()
+                cls._resource_cache[resource_metadata_url] = (time.monotonic(), metadata)
+                return metadata
         except Exception as e:
             print(f"Failed to fetch protected resource metadata from {resource_metadata_url}: {str(get_error_message(e))}")
             return None
@@ -94,21 +179,27 @@ class OAuthUtils:
     @classmethod
     async def fetch_authorization_server_metadata(
         cls, auth_server_metadata_url: str
-    ) -> Optional[OAuthAuthorizationServerMetadata]:
+    ) -> Optional[Dict[str, Any]]:
         """获取 OAuth 授权服务器元数据"""
+        cached = cls._get_cached(cls._auth_server_cache, auth_server_metadata_url)
+        if cached is not None:
+            return cached
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(auth_server_metadata_url) as response:
-                    if not response.ok:
-                        return None
-                    return await response.json()
+            session = await cls._get_session()
+            async with session.get(auth_server_metadata_url, timeout=cls._REQUEST_TIMEOUT) as response:
+                if not response.ok:
+                    return None
+                metadata = await response.json()
+                cls._auth_server_cache[auth_server_metadata_url] = (time.monotonic(), metadata)
+                return metadata
         except Exception as e:
             print(f"Failed to fetch authorization server metadata from {auth_server_metadata_url}: {str(get_error_message(e))}")
             return None
     
     @classmethod
     def metadata_to_oauth_config(
-        cls, metadata: OAuthAuthorizationServerMetadata
+        cls, metadata: Dict[str, Any]
     ) -> MCPOAuthConfig:
         """将授权服务器元数据转换为 OAuth 配置"""
         return {
@@ -176,10 +267,8 @@ class OAuthUtils:
     @classmethod
     def parse_www_authenticate_header(cls, header: str) -> Optional[str]:
         """解析 WWW-Authenticate 头部以提取 OAuth 信息"""
-        match = re.search(r'resource_metadata="([^"]+)"', header)
-        if match:
-            return match.group(1)
-        return None
+        match = _RESOURCE_METADATA_RE.search(header)
+        return match.group(1) if match else None
     
     @classmethod
     async def discover_oauth_from_www_authenticate(
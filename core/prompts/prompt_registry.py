@@ -1,3 +1,5 @@
+import bisect
+import copy
 from typing import Dict, List, Optional
 from ..tools.mcp_client import DiscoveredMCPPrompt
 
@@ -6,6 +8,19 @@ class PromptRegistry:
     def __init__(self):
         """初始化提示注册表。"""
         self._prompts: Dict[str, DiscoveredMCPPrompt] = {}
+        # 按名称保持有序的索引，避免每次查询都扫描并排序
+        self._sorted_all: List[DiscoveredMCPPrompt] = []
+        self._by_server: Dict[str, List[DiscoveredMCPPrompt]] = {}
+
+    def _add(self, prompt: DiscoveredMCPPrompt) -> None:
+        """将提示写入主表和有序索引。"""
+        previous = self._prompts.get(prompt.name)
+        if previous is not None:
+            self._sorted_all.remove(previous)
+            self._by_server[previous.server_name].remove(previous)
+        self._prompts[prompt.name] = prompt
+        bisect.insort(self._sorted_all, prompt, key=lambda p: p.name)
+        bisect.insort(self._by_server.setdefault(prompt.server_name, []), prompt, key=lambda p: p.name)
     
     def register_prompt(self, prompt: DiscoveredMCPPrompt) -> None:
         """
@@ -17,14 +32,12 @@ class PromptRegistry:
         if prompt.name in self._prompts:
             new_name = f"{prompt.server_name}_{prompt.name}"
             print(f"警告: 名称为\"{prompt.name}\"的提示已注册。重命名为\"{new_name}\"。")
-            # 创建新的提示对象，修改名称
-            updated_prompt = prompt.__class__()
-            for attr_name, attr_value in prompt.__dict__.items():
-                setattr(updated_prompt, attr_name, attr_value)
+            # 浅拷贝提示对象并修改名称（不依赖构造函数的参数）
+            updated_prompt = copy.copy(prompt)
             updated_prompt.name = new_name
-            self._prompts[new_name] = updated_prompt
+            self._add(updated_prompt)
         else:
-            self._prompts[prompt.name] = prompt
+            self._add(prompt)
     
     def get_all_prompts(self) -> List[DiscoveredMCPPrompt]:
         """
@@ -33,7 +46,7 @@ class PromptRegistry:
         Returns:
             按名称排序的提示实例列表
         """
-        return sorted(self._prompts.values(), key=lambda prompt: prompt.name)
+        return list(self._sorted_all)
     
     def get_prompt(self, name: str) -> Optional[DiscoveredMCPPrompt]:
         """
@@ -57,8 +70,4 @@ class PromptRegistry:
         Returns:
             按名称排序的指定服务器的提示列表
         """
-        server_prompts: List[DiscoveredMCPPrompt] = []
-        for prompt in self._prompts.values():
-            if prompt.server_name == server_name:
-                server_prompts.append(prompt)
-        return sorted(server_prompts, key=lambda prompt: prompt.name)
\ No newline at end of file
+        return list(self._by_server.get(server_name, ()))
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""循环检测的原生加速内核（可选依赖 numba / numpy）
+
+在 numba 可用时，将滚动哈希的滑动窗口循环编译为本地代码，批量计算一段区域内
+所有窗口的哈希；不可用时 AVAILABLE 为 False，调用方回退到纯 Python 实现。
+内核计算结果与 loop_detection_service 中的纯 Python 滚动哈希完全一致。
+"""
+from array import array
+from typing import Optional, Sequence
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
+_MOD = (1 << 61) - 1
+_MASK31 = (1 << 31) - 1
+_MASK30 = (1 << 30) - 1
+
+
+def _mul_mod(a, b):
+    """计算 a * b mod (2^61 - 1)，要求 a < 2^61、b < 2^31，全程不超出 int64"""
+    lo = (a & _MASK31) * b
+    hi = (a >> 31) * b
+    # hi * 2^31 = (hi >> 30) * 2^61 + (hi & MASK30) * 2^31，且 2^61 ≡ 1
+    r = (hi >> 30) + ((hi & _MASK30) << 31) + lo
+    r = (r & _MOD) + (r >> 61)
+    if r >= _MOD:
+        r -= _MOD
+    return r
+
+
+def _slide_hashes_into(buf, start, count, chunk_size, prev_hash, base, top, out):
+    """计算起点为 start .. start+count-1 的各窗口哈希并写入 out
+
+    buf 为码位序列；prev_hash 为起点 start-1 窗口的哈希，小于 0 表示需要从头计算。
+    top 为 base^(chunk_size-1) mod p。
+    """
+    h = prev_hash
+    for k in range(count):
+        i = start + k
+        if h < 0:
+            h = 0
+            for j in range(i, i + chunk_size):
+                h = _mul_mod(h, base) + buf[j]
+                if h >= _MOD:
+                    h -= _MOD
+        else:
+            h -= _mul_mod(top, buf[i - 1])
+            if h < 0:
+                h += _MOD
+            h = _mul_mod(h, base) + buf[i + chunk_size - 1]
+            if h >= _MOD:
+                h -= _MOD
+        out[k] = h
+
+
+AVAILABLE = njit is not None
+
+if AVAILABLE:
+    _mul_mod = njit(cache=True, inline='always')(_mul_mod)
+    _slide_hashes_native = njit(cache=True)(_slide_hashes_into)
+
+
+def compute_window_hashes(
+    buf: array,
+    start: int,
+    count: int,
+    chunk_size: int,
+    prev_hash: Optional[int],
+    base: int,
+    top: int,
+) -> Sequence[int]:
+    """批量计算 count 个连续窗口的滚动哈希（需 AVAILABLE 为 True）"""
+    # astype 会复制数据，不会长期持有码位数组的缓冲区导出（否则无法原地截断）
+    data = np.frombuffer(buf, dtype=np.uint32).astype(np.int64)
+    out = np.empty(count, dtype=np.int64)
+    _slide_hashes_native(
+        data, start, count, chunk_size, -1 if prev_hash is None else prev_hash,
+        base, top, out
+    )
+    return out
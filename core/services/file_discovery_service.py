@@ -28,6 +28,9 @@ class FileDiscoveryService:
         self.project_root = os.path.abspath(project_root)
         self.git_ignore_filter: Optional[GitIgnoreFilter] = None
         self.gemini_ignore_filter: Optional[GitIgnoreFilter] = None
+        # 忽略规则在初始化后不再变化，因此可以缓存每个路径（文件或目录）的判定结果
+        self._git_cache: Dict[str, bool] = {}
+        self._gemini_cache: Dict[str, bool] = {}
 
         # 初始化git忽略过滤器
         if is_git_repository(self.project_root):
@@ -63,18 +66,114 @@ class FileDiscoveryService:
         if options is None:
             options = FilterFilesOptions()
 
+        git_filter = self.git_ignore_filter if options.respect_git_ignore else None
+        gemini_filter = (
+            self.gemini_ignore_filter if options.respect_gemini_ignore else None
+        )
+
+        if not git_filter and not gemini_filter:
+            return list(file_paths)
+
+        git_mask = (
+            self._ignore_mask(git_filter, self._git_cache, file_paths)
+            if git_filter
+            else None
+        )
+        gemini_mask = (
+            self._ignore_mask(gemini_filter, self._gemini_cache, file_paths)
+            if gemini_filter
+            else None
+        )
+
+        if git_mask is None:
+            return [p for p, ignored in zip(file_paths, gemini_mask) if not ignored]
+        if gemini_mask is None:
+            return [p for p, ignored in zip(file_paths, git_mask) if not ignored]
         return [
-            file_path
-            for file_path in file_paths
-            if not (
-                (options.respect_git_ignore and self.should_git_ignore_file(file_path))
-                or (
-                    options.respect_gemini_ignore
-                    and self.should_gemini_ignore_file(file_path)
-                )
-            )
+            p
+            for p, git_ignored, gemini_ignored in zip(file_paths, git_mask, gemini_mask)
+            if not (git_ignored or gemini_ignored)
         ]
 
+    def _ignore_mask(
+        self, ignore_filter: GitIgnoreFilter, cache: Dict[str, bool], file_paths: List[str]
+    ) -> List[bool]:
+        """批量计算一组路径的忽略结果
+
+        已缓存的路径和父目录已被忽略的路径直接得出结果，其余路径一次性交给
+        过滤器的 filter 方法批量匹配。
+
+        Args:
+            ignore_filter: 使用的忽略过滤器
+            cache: 该过滤器对应的结果缓存
+            file_paths: 要检查的文件路径列表
+
+        Returns:
+            与输入一一对应的布尔列表，True 表示该路径被忽略
+        """
+        mask = [False] * len(file_paths)
+        pending_indices: List[int] = []
+        pending_paths: List[str] = []
+
+        for index, file_path in enumerate(file_paths):
+            ignored = cache.get(file_path)
+            if ignored is None:
+                parent = os.path.dirname(file_path)
+                if (
+                    parent
+                    and parent != file_path
+                    and parent != self.project_root
+                    and self._is_path_ignored(ignore_filter, cache, parent)
+                ):
+                    ignored = True
+                    cache[file_path] = True
+                else:
+                    pending_indices.append(index)
+                    pending_paths.append(file_path)
+                    continue
+            mask[index] = ignored
+
+        if pending_paths:
+            results = ignore_filter.filter(pending_paths)
+            for index, file_path, ignored in zip(pending_indices, pending_paths, results):
+                cache[file_path] = ignored
+                mask[index] = ignored
+
+        return mask
+
+    def _is_path_ignored(
+        self, ignore_filter: GitIgnoreFilter, cache: Dict[str, bool], path: str
+    ) -> bool:
+        """检查路径是否被忽略，结果按路径缓存
+
+        与git语义一致，若某个父目录已被忽略，则其下所有文件都被忽略；
+        每个唯一目录只需做一次模式匹配。
+
+        Args:
+            ignore_filter: 使用的忽略过滤器
+            cache: 该过滤器对应的结果缓存
+            path: 要检查的文件或目录路径
+
+        Returns:
+            如果路径应该被忽略，则返回True，否则返回False
+        """
+        ignored = cache.get(path)
+        if ignored is not None:
+            return ignored
+
+        parent = os.path.dirname(path)
+        if (
+            parent
+            and parent != path
+            and parent != self.project_root
+            and self._is_path_ignored(ignore_filter, cache, parent)
+        ):
+            ignored = True
+        else:
+            ignored = bool(ignore_filter.is_ignored(path))
+        cache[path] = ignored
+        return ignored
+
     def should_git_ignore_file(self, file_path: str) -> bool:
         """检查单个文件是否应该被git忽略
 
@@ -85,7 +184,9 @@ class FileDiscoveryService:
             如果文件应该被忽略，则返回True，否则返回False
         """
         if self.git_ignore_filter:
-            return self.git_ignore_filter.is_ignored(file_path)
+            return self._is_path_ignored(
+                self.git_ignore_filter, self._git_cache, file_path
+            )
         return False
 
     def should_gemini_ignore_file(self, file_path: str) -> bool:
@@ -98,7 +199,9 @@ class FileDiscoveryService:
             如果文件应该被忽略，则返回True，否则返回False
         """
         if self.gemini_ignore_filter:
-            return self.gemini_ignore_filter.is_ignored(file_path)
+            return self._is_path_ignored(
+                self.gemini_ignore_filter, self._gemini_cache, file_path
+            )
         return False
 
     def should_ignore_file(
@@ -1,12 +1,19 @@
 import asyncio
 import os
 import pathlib
+import shutil
 import subprocess
 from typing import Optional
 from git import Repo, GitCommandError
 from dataclasses import dataclass
 from ..utils.path import GEMINI_DIR,get_project_hash
 
+try:
+    # 可选依赖：可用时在进程内完成快照，避免每次派生git子进程
+    import pygit2
+except ImportError:
+    pygit2 = None
+
 
 def is_node_error(error: Exception) -> bool:
     """检查是否为Node错误"""
@@ -14,9 +21,24 @@ def is_node_error(error: Exception) -> bool:
     return hasattr(error, 'code')
 
 
+def _write_if_changed(file_path: str, content: str) -> None:
+    """仅在内容变化时写入文件，避免不必要的磁盘写入"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return
+    except OSError:
+        pass
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
 class GitService:
     """Git服务类，提供项目版本控制相关功能"""
 
+    # 进程内缓存git是否可用，避免每个实例重复检查
+    _git_available: Optional[bool] = None
+
     def __init__(self, project_root: str):
         """初始化Git服务
 
@@ -24,12 +46,24 @@ class GitService:
             project_root: 项目根目录路径
         """
         self.project_root = os.path.abspath(project_root)
+        # 项目根目录不变，历史目录只需计算一次
+        self._history_dir = os.path.join(
+            os.path.expanduser('~'), GEMINI_DIR, 'history', get_project_hash(self.project_root)
+        )
+        self._repo: Optional[Repo] = None
+        self._pygit2_repo = None
+        # 影子仓库的环境变量在实例生命周期内不变，只构建一次
+        self._env = {
+            **os.environ,
+            'GIT_DIR': os.path.join(self._history_dir, '.git'),
+            'GIT_WORK_TREE': self.project_root,
+            'HOME': self._history_dir,
+            'XDG_CONFIG_HOME': self._history_dir,
+        }
 
     def get_history_dir(self) -> str:
         """获取历史记录目录路径"""
-        hash_value = get_project_hash(self.project_root)
-        home_dir = os.path.expanduser('~')
-        return os.path.join(home_dir, GEMINI_DIR, 'history', hash_value)
+        return self._history_dir
 
     async def initialize(self) -> None:
         """初始化Git服务"""
@@ -42,17 +76,25 @@ class GitService:
 
     async def verify_git_availability(self) -> bool:
         """验证Git是否可用"""
+        if GitService._git_available is not None:
+            return GitService._git_available
+
+        # 大多数情况下在PATH中查找即可得出结论，无需派生子进程
+        if shutil.which('git') is None:
+            GitService._git_available = False
+            return False
+
         try:
-            # 使用asyncio运行同步子进程命令
+            # 确认找到的git可以正常运行；不读取输出，因此丢弃管道
             process = await asyncio.create_subprocess_exec(
                 'git', '--version',
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
             )
-            await process.wait()
-            return process.returncode == 0
-        except FileNotFoundError:
-            return False
+            GitService._git_available = await process.wait() == 0
+        except OSError:
+            GitService._git_available = False
+        return GitService._git_available
 
     async def setup_shadow_git_repository(self) -> None:
         """在项目根目录创建一个隐藏的Git仓库"""
@@ -63,15 +105,15 @@ class GitService:
         pathlib.Path(repo_dir).mkdir(parents=True, exist_ok=True)
 
         # 写入git配置
-        git_config_content = (
-            '[user]' +
-            '  name = Gemini CLI' +
-            '  email = gemini-cli@google.com' +
-            '[commit]' +
-            '  gpgsign = false'
-        )
-        with open(git_config_path, 'w', encoding='utf-8') as f:
-            f.write(git_config_content)
+        git_config_content = '\n'.join([
+            '[user]',
+            '  name = Gemini CLI',
+            '  email = gemini-cli@google.com',
+            '[commit]',
+            '  gpgsign = false',
+            ''
+        ])
+        _write_if_changed(git_config_path, git_config_content)
 
         # 初始化仓库
         is_repo_defined = False
@@ -104,24 +146,15 @@ class GitService:
             if not (is_node_error(e) and e.code == 'ENOENT'):
                 raise e
 
-        with open(shadow_git_ignore_path, 'w', encoding='utf-8') as f:
-            f.write(user_git_ignore_content)
+        _write_if_changed(shadow_git_ignore_path, user_git_ignore_content)
 
     @property
     def shadow_git_repository(self) -> Repo:
-        """获取影子Git仓库对象"""
-        repo_dir = self.get_history_dir()
-        git_dir = os.path.join(repo_dir, '.git')
-
-        # 设置环境变量
-        env = os.environ.copy()
-        env['GIT_DIR'] = git_dir
-        env['GIT_WORK_TREE'] = self.project_root
-        env['HOME'] = repo_dir
-        env['XDG_CONFIG_HOME'] = repo_dir
-
-        # 创建Repo对象时传递环境变量
-        return Repo(self.project_root, env=env)
+        """获取影子Git仓库对象（首次访问时创建并缓存）"""
+        if self._repo is None:
+            # 创建Repo对象时传递环境变量
+            self._repo = Repo(self.project_root, env=self._env)
+        return self._repo
 
     async def get_current_commit_hash(self) -> str:
         """获取当前提交哈希值"""
@@ -137,6 +170,10 @@ class GitService:
         Returns:
             提交哈希值
         """
+        if pygit2 is not None:
+            # 遍历索引与写树都是同步操作，放到线程中执行，避免大仓库阻塞事件循环
+            return await asyncio.to_thread(self._create_file_snapshot_in_process, message)
+
         repo = self.shadow_git_repository
         # 添加所有文件
         repo.git.add('.')
@@ -144,6 +181,33 @@ class GitService:
         commit = repo.index.commit(message)
         return commit.hexsha
 
+    def _create_file_snapshot_in_process(self, message: str) -> str:
+        """使用pygit2在进程内暂存并提交，等价于 git add . && git commit"""
+        repo = self._pygit2_repo
+        if repo is None:
+            # 与子进程路径的 HOME / XDG_CONFIG_HOME 隔离一致：libgit2 的全局与 XDG 配置
+            # 只从历史目录读取，不受用户 ~/.gitconfig（core.excludesFile、core.autocrlf 等）影响
+            pygit2.settings.search_path[pygit2.GIT_CONFIG_LEVEL_GLOBAL] = self._history_dir
+            pygit2.settings.search_path[pygit2.GIT_CONFIG_LEVEL_XDG] = os.path.join(self._history_dir, 'git')
+            repo = pygit2.Repository(os.path.join(self._history_dir, '.git'))
+            repo.workdir = self.project_root
+            self._pygit2_repo = repo
+
+        index = repo.index
+        index.read()
+        index.add_all()
+        # add_all 不会暂存删除，手动移除工作区中已不存在的条目
+        for entry in list(index):
+            if not os.path.lexists(os.path.join(self.project_root, entry.path)):
+                index.remove(entry.path)
+        index.write()
+        tree = index.write_tree()
+
+        signature = pygit2.Signature('Gemini CLI', 'gemini-cli@google.com')
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        oid = repo.create_commit('HEAD', signature, signature, message, tree, parents)
+        return str(oid)
+
     async def restore_project_from_snapshot(self, commit_hash: str) -> None:
         """从快照恢复项目
 
@@ -154,4 +218,6 @@ class GitService:
         # 恢复文件
         repo.git.restore('--source', commit_hash, '.')
         # 清理未跟踪的文件
-        repo.git.clean('f', '-d')
\ No newline at end of file
+        repo.git.clean('f', '-d')
+        # 工作区已被改写，丢弃缓存的git命令进程以免读取到过期状态
+        repo.git.clear_cache()
\ No newline at end of file
@@ -1,10 +1,17 @@
-import hashlib
+import bisect
 import json
-from typing import Dict, List, Optional, Any, Union, Set
+import logging
+import sys
+from array import array
+from typing import Dict, List, Optional, Any, Union, Set, Tuple
 import asyncio
 from dataclasses import dataclass
 from enum import Enum
 
+from . import _loop_kernels
+
+logger = logging.getLogger(__name__)
+
 # 假设以下是从其他文件导入的类和类型
 def logLoopDetected(config, loop_event):
     # 实现日志记录逻辑
@@ -57,6 +64,10 @@ TOOL_CALL_LOOP_THRESHOLD = 5
 CONTENT_LOOP_THRESHOLD = 10
 CONTENT_CHUNK_SIZE = 50
 MAX_HISTORY_LENGTH = 1000
+# 快速路径中用 bytes.find 扫描的"热"内容块（已出现至少两次）的最大数量
+MAX_HOT_CHUNKS_TO_SCAN = 16
+# 待处理窗口数达到该值时，改用原生内核批量计算滚动哈希（需要 numba）
+NATIVE_HASH_BATCH_MIN = 512
 # 当请求LLM检查循环时，要包含在历史记录中的最近对话轮次数量
 LLM_LOOP_CHECK_HISTORY_COUNT = 20
 # 在基于LLM的循环检查被激活之前，单个提示中必须经过的轮次数量。
@@ -70,58 +81,166 @@ MAX_LLM_CHECK_INTERVAL = 15
 # 用于检测和防止AI响应中无限循环的服务。监控工具调用重复和内容句子重复。
 DEFAULT_GEMINI_FLASH_MODEL = "gemini-flash"
 
+# LLM 循环检查使用的固定提示词和响应模式，在模块加载时构建一次
+_LLM_LOOP_CHECK_PROMPT = (
+    "You are a sophisticated AI diagnostic agent specializing in identifying when a conversational AI is stuck in an unproductive state. Your task is to analyze the provided conversation history and determine if the assistant has ceased to make meaningful progress.\n\n"
+    "An unproductive state is characterized by one or more of the following patterns over the last 5 or more assistant turns:\n\n"
+    "Repetitive Actions: The assistant repeats the same tool calls or conversational responses a decent number of times. This includes simple loops (e.g., tool_A, tool_A, tool_A) and alternating patterns (e.g., tool_A, tool_B, tool_A, tool_B, ...).\n\n"
+    "Cognitive Loop: The assistant seems unable to determine the next logical step. It might express confusion, repeatedly ask the same questions, or generate responses that don't logically follow from the previous turns, indicating it's stuck and not advancing the task.\n\n"
+    "Crucially, differentiate between a true unproductive state and legitimate, incremental progress."
+    "For example, a series of 'tool_A' or 'tool_B' tool calls that make small, distinct changes to the same file (like adding docstrings to functions one by one) is considered forward progress and is NOT a loop. A loop would be repeatedly replacing the same text with the same content, or cycling between a small set of files with no net change.\n\n"
+    "Please analyze the conversation history to determine the possibility that the conversation is stuck in a repetitive, non-productive state."
+)
+
+_LLM_LOOP_CHECK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'reasoning': {
+            'type': 'string',
+            'description': 'Your reasoning on if the conversation is looping without forward progress.'
+        },
+        'confidence': {
+            'type': 'number',
+            'description': 'A number between 0.0 and 1.0 representing your confidence that the conversation is in an unproductive state.'
+        }
+    },
+    'required': ['reasoning', 'confidence']
+}
+
+# 内容块指纹使用 Rabin-Karp 多项式滚动哈希（模 2^61-1 的梅森素数），
+# 滑动窗口每次前进一个字符只需 O(1) 更新；哈希碰撞由 is_actual_content_match 兜底。
+_ROLLING_HASH_MOD = (1 << 61) - 1
+_ROLLING_HASH_BASE = 1_000_003
+_ROLLING_HASH_TOP = pow(_ROLLING_HASH_BASE, CONTENT_CHUNK_SIZE - 1, _ROLLING_HASH_MOD)
+
+# 流历史以定长的码位数组保存（每个字符一个 32 位元素），块大小与历史长度都按字符计，
+# 与非 ASCII 文本的 UTF-8 字节长度无关
+_CODE_POINT_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+_CODE_POINT_ENCODING = 'utf-32-le' if sys.byteorder == 'little' else 'utf-32-be'
+_CODE_POINT_SIZE = 4
+
+
+def _chunk_hash(chunk: array) -> int:
+    """计算单个内容块的多项式哈希"""
+    h = 0
+    for code_point in chunk:
+        h = (h * _ROLLING_HASH_BASE + code_point) % _ROLLING_HASH_MOD
+    return h
+
+
 class LoopDetectionService:
     def __init__(self, config: Config):
         self.config = config
         self.prompt_id = ''
 
         # 工具调用跟踪
-        self.last_tool_call_key: Optional[str] = None
+        self.last_tool_call_key: Optional[Tuple[str, str]] = None
         self.tool_call_repetition_count: int = 0
 
         # 内容流跟踪
-        self.stream_content_history = ''
-        self.content_stats: Dict[str, List[int]] = {}  # hash -> list of indices
+        # 内容的码位缓冲区，按环形缓冲区使用：所有索引均为流中的绝对字符偏移，
+        # 截断只前移 history_start，已失效的前缀积累到一定量后才整体移除
+        self.stream_content_history = array(_CODE_POINT_TYPECODE)
+        self.history_base_offset = 0  # stream_content_history[0] 的绝对偏移
+        self.history_start = 0  # 逻辑历史的起始绝对偏移
+        self.content_stats: Dict[int, List[int]] = {}  # hash -> list of absolute indices
         self.last_content_index = 0
+        # 上一个已处理窗口（起点为 last_content_index - 1）的滚动哈希，None 表示需要重新计算
+        self.last_chunk_hash: Optional[int] = None
+        # 已重复出现（至少两次）的内容块哈希，按最近出现顺序排列
+        self.hot_chunks: Dict[int, None] = {}
         self.loop_detected = False
         self.in_code_block = False
+        # 尚未检测的流式内容；累积到一个内容块大小后再统一检测，摊薄逐 token 的开销
+        self.pending_content: List[str] = []
+        self.pending_content_length = 0
 
         # LLM 循环跟踪
         self.turns_in_current_prompt = 0
         self.llm_check_interval = DEFAULT_LLM_CHECK_INTERVAL
         self.last_check_turn = 0
+        # 后台运行的 LLM 循环检查，turn_started 不等待其完成
+        self.llm_check_task: Optional[asyncio.Task] = None
+        self.llm_loop_detected = False
+        self.llm_check_generation = 0  # 每次重置递增，用于丢弃重置前发起的检查结果
 
-    def get_tool_call_key(self, tool_call: Dict[str, Any]) -> str:
-        name = tool_call['name']
+        # 日志事件先入队，由后台任务写出，检测路径上不做同步 I/O
+        self.log_queue: asyncio.Queue = asyncio.Queue()
+        self.log_task: Optional[asyncio.Task] = None
+
+    def get_tool_call_key(self, tool_call: Dict[str, Any]) -> Tuple[str, str]:
+        # 该键只用于与上一次工具调用做相等比较，无需加密哈希
         args = tool_call['args']
-        args_string = json.dumps(args, sort_keys=True)
-        key_string = f"{name}:{args_string}"
-        return hashlib.sha256(key_string.encode()).hexdigest()
+        # 快速路径：无参数或单个简单参数时不做 JSON 序列化。
+        # 键和值都用 repr 表示，结果不会与 JSON 形式或彼此冲突
+        if not args:
+            return (tool_call['name'], '')
+        if len(args) == 1:
+            key, value = next(iter(args.items()))
+            if value is None or isinstance(value, (str, int)):
+                return (tool_call['name'], f'{key!r}={value!r}')
+        return (tool_call['name'], json.dumps(args, sort_keys=True, separators=(',', ':')))
 
     def add_and_check(self, event: ServerGeminiStreamEvent) -> bool:
         if self.loop_detected:
             return True
 
         if event.type == GeminiEventType.ToolCallRequest:
+            if self.flush_pending_content():
+                return True
             # 工具调用之间重置内容跟踪
             self.reset_content_tracking()
             self.loop_detected = self.check_tool_call_loop(event.value)
         elif event.type == GeminiEventType.Content:
-            self.loop_detected = self.check_content_loop(event.value)
+            content = event.value
+            if '`' in content:
+                # 可能包含代码围栏，先处理已累积的内容以保持围栏状态的语义
+                if self.flush_pending_content():
+                    return True
+                self.loop_detected = self.check_content_loop(content)
+            else:
+                self.pending_content.append(content)
+                self.pending_content_length += len(content)
+                if self.pending_content_length >= CONTENT_CHUNK_SIZE:
+                    self.flush_pending_content()
+
+        return self.loop_detected
 
+    def flush_pending_content(self) -> bool:
+        """对累积的流式内容执行循环检测，应在流结束时调用"""
+        if self.pending_content and not self.loop_detected:
+            content = ''.join(self.pending_content)
+            self.pending_content.clear()
+            self.pending_content_length = 0
+            self.loop_detected = self.check_content_loop(content)
         return self.loop_detected
 
     async def turn_started(self, signal) -> bool:
+        if self.flush_pending_content():
+            return True
+
         self.turns_in_current_prompt += 1
 
         if (
             self.turns_in_current_prompt >= LLM_CHECK_AFTER_TURNS
             and self.turns_in_current_prompt - self.last_check_turn >= self.llm_check_interval
         ):
-            self.last_check_turn = self.turns_in_current_prompt
-            return await self.check_for_loop_with_llm(signal)
-
-        return False
+            # 上一次检查仍在进行时不重复发起
+            if self.llm_check_task is None or self.llm_check_task.done():
+                self.last_check_turn = self.turns_in_current_prompt
+                task = asyncio.create_task(self.check_for_loop_with_llm(signal))
+                generation = self.llm_check_generation
+                task.add_done_callback(lambda t: self.on_llm_check_done(t, generation))
+                self.llm_check_task = task
+
+        # 返回最近一次已完成的检查结果，不阻塞当前轮次
+        return self.llm_loop_detected
+
+    def on_llm_check_done(self, task: asyncio.Task, generation: int) -> None:
+        if generation != self.llm_check_generation or task.cancelled():
+            return
+        if task.exception() is None and task.result():
+            self.llm_loop_detected = True
 
     def check_tool_call_loop(self, tool_call: Dict[str, Any]) -> bool:
         key = self.get_tool_call_key(tool_call)
@@ -154,40 +273,87 @@ class LoopDetectionService:
         if was_in_code_block:
             return False
 
-        self.stream_content_history += content
+        self.stream_content_history.frombytes(content.encode(_CODE_POINT_ENCODING))
 
         self.truncate_and_update()
         return self.analyze_content_chunks_for_loop()
 
     def truncate_and_update(self) -> None:
-        if len(self.stream_content_history) <= MAX_HISTORY_LENGTH:
+        history = self.stream_content_history
+        history_start = self.history_base_offset + len(history) - MAX_HISTORY_LENGTH
+        if history_start <= self.history_start:
             return
 
-        # 计算需要从开头移除的内容量
-        truncation_amount = len(self.stream_content_history) - MAX_HISTORY_LENGTH
-        self.stream_content_history = self.stream_content_history[truncation_amount:]
-        self.last_content_index = max(0, self.last_content_index - truncation_amount)
-
-        # 更新所有存储的块索引以适应截断
-        for hash_key, old_indices in list(self.content_stats.items()):
-            adjusted_indices = [
-                index - truncation_amount
-                for index in old_indices
-                if index - truncation_amount >= 0
-            ]
-
-            if adjusted_indices:
-                self.content_stats[hash_key] = adjusted_indices
-            else:
-                del self.content_stats[hash_key]
+        # 逻辑截断：只前移历史起点，过期的块索引在访问时惰性清理
+        self.history_start = history_start
+        if self.last_content_index < history_start:
+            self.last_content_index = history_start
+            self.last_chunk_hash = None
+
+        # 失效前缀超过一半容量时才真正移除，并一次性清理过期的块索引
+        dead_chars = history_start - self.history_base_offset
+        if dead_chars > MAX_HISTORY_LENGTH // 2:
+            del history[:dead_chars]
+            self.history_base_offset = history_start
+            for hash_key in list(self.content_stats):
+                self.get_live_indices(hash_key)
+
+    def get_live_indices(self, hash_key: int) -> Optional[List[int]]:
+        """返回内容块仍在历史窗口内的出现位置，并清理已被截断的位置"""
+        indices = self.content_stats.get(hash_key)
+        if indices is None or indices[0] >= self.history_start:
+            return indices
+
+        del indices[:bisect.bisect_left(indices, self.history_start)]
+        if len(indices) < 2:
+            self.hot_chunks.pop(hash_key, None)
+        if not indices:
+            del self.content_stats[hash_key]
+            return None
+        return indices
 
     def analyze_content_chunks_for_loop(self) -> bool:
+        if self.hot_chunks and self.has_more_chunks_to_process() and self.scan_hot_chunks_for_loop():
+            logLoopDetected(
+                self.config,
+                LoopDetectedEvent(
+                    LoopType.CHANTING_IDENTICAL_SENTENCES,
+                    self.prompt_id
+                )
+            )
+            return True
+
+        history = self.stream_content_history
+        base = self.history_base_offset
+        chunk_hash = self.last_chunk_hash
+
+        # 待处理区域较大时，由原生内核一次性算出所有窗口的哈希
+        batch_start = self.last_content_index
+        batch_hashes = None
+        pending_windows = base + len(history) - CONTENT_CHUNK_SIZE + 1 - batch_start
+        if _loop_kernels.AVAILABLE and pending_windows >= NATIVE_HASH_BATCH_MIN:
+            batch_hashes = _loop_kernels.compute_window_hashes(
+                history, batch_start - base, pending_windows, CONTENT_CHUNK_SIZE,
+                chunk_hash if batch_start > base else None,
+                _ROLLING_HASH_BASE, _ROLLING_HASH_TOP
+            )
+
         while self.has_more_chunks_to_process():
+            index = self.last_content_index
+            offset = index - base
             # 提取当前文本块
-            current_chunk = self.stream_content_history[
-                self.last_content_index : self.last_content_index + CONTENT_CHUNK_SIZE
-            ]
-            chunk_hash = hashlib.sha256(current_chunk.encode()).hexdigest()
+            current_chunk = history[offset : offset + CONTENT_CHUNK_SIZE]
+            if batch_hashes is not None:
+                chunk_hash = int(batch_hashes[index - batch_start])
+            elif chunk_hash is None or offset == 0:
+                chunk_hash = _chunk_hash(current_chunk)
+            else:
+                # 移出上一窗口的首字符，移入当前窗口的末字符
+                chunk_hash = (
+                    (chunk_hash - history[offset - 1] * _ROLLING_HASH_TOP) * _ROLLING_HASH_BASE
+                    + history[offset + CONTENT_CHUNK_SIZE - 1]
+                ) % _ROLLING_HASH_MOD
+            self.last_chunk_hash = chunk_hash
 
             if self.is_loop_detected_for_chunk(current_chunk, chunk_hash):
                 logLoopDetected(
@@ -204,11 +370,48 @@ class LoopDetectionService:
 
         return False
 
+    def scan_hot_chunks_for_loop(self) -> bool:
+        """快速路径：用 bytes.find 在未处理区域中查找已重复内容块的后续出现位置
+
+        只有当逐位置扫描同样会判定为循环时才返回 True；否则不修改块统计，
+        由逐位置扫描继续处理。
+        """
+        history = self.stream_content_history
+        base = self.history_base_offset
+        # 码位数组没有 find，在其字节副本上查找（历史有上限，副本很小）；
+        # 只接受与字符边界对齐的匹配位置
+        data = history.tobytes()
+        start = (self.last_content_index - base) * _CODE_POINT_SIZE
+        hot_hashes = list(self.hot_chunks)[-MAX_HOT_CHUNKS_TO_SCAN:]
+
+        for hash_key in reversed(hot_hashes):
+            existing_indices = self.get_live_indices(hash_key)
+            if not existing_indices:
+                continue
+            first_offset = existing_indices[0] - base
+            chunk = history[first_offset : first_offset + CONTENT_CHUNK_SIZE].tobytes()
+
+            indices = existing_indices[-(CONTENT_LOOP_THRESHOLD - 1):]
+            count = len(existing_indices)
+            position = data.find(chunk, start)
+            while position != -1:
+                if not position % _CODE_POINT_SIZE:
+                    indices.append(position // _CODE_POINT_SIZE + base)
+                    count += 1
+                    if count >= CONTENT_LOOP_THRESHOLD and self.is_clustered(indices[-CONTENT_LOOP_THRESHOLD:]):
+                        return True
+                position = data.find(chunk, position + 1)
+
+        return False
+
     def has_more_chunks_to_process(self) -> bool:
-        return self.last_content_index + CONTENT_CHUNK_SIZE <= len(self.stream_content_history)
+        return (
+            self.last_content_index + CONTENT_CHUNK_SIZE
+            <= self.history_base_offset + len(self.stream_content_history)
+        )
 
-    def is_loop_detected_for_chunk(self, chunk: str, hash_key: str) -> bool:
-        existing_indices = self.content_stats.get(hash_key)
+    def is_loop_detected_for_chunk(self, chunk: array, hash_key: int) -> bool:
+        existing_indices = self.get_live_indices(hash_key)
 
         if not existing_indices:
             self.content_stats[hash_key] = [self.last_content_index]
@@ -218,65 +421,45 @@ class LoopDetectionService:
             return False
 
         existing_indices.append(self.last_content_index)
+        self.hot_chunks.pop(hash_key, None)
+        self.hot_chunks[hash_key] = None
 
         if len(existing_indices) < CONTENT_LOOP_THRESHOLD:
             return False
 
         # 分析最近的出现次数，看它们是否紧密聚集
-        recent_indices = existing_indices[-CONTENT_LOOP_THRESHOLD:]
+        return self.is_clustered(existing_indices[-CONTENT_LOOP_THRESHOLD:])
+
+    def is_clustered(self, recent_indices: List[int]) -> bool:
         total_distance = recent_indices[-1] - recent_indices[0]
         average_distance = total_distance / (CONTENT_LOOP_THRESHOLD - 1)
         max_allowed_distance = CONTENT_CHUNK_SIZE * 1.5
 
         return average_distance <= max_allowed_distance
 
-    def is_actual_content_match(self, current_chunk: str, original_index: int) -> bool:
-        original_chunk = self.stream_content_history[
-            original_index : original_index + CONTENT_CHUNK_SIZE
-        ]
-        return original_chunk == current_chunk
+    def is_actual_content_match(self, current_chunk: array, original_index: int) -> bool:
+        offset = original_index - self.history_base_offset
+        return self.stream_content_history[offset : offset + CONTENT_CHUNK_SIZE] == current_chunk
 
     async def check_for_loop_with_llm(self, signal) -> bool:
         recent_history = self.config.getGeminiClient().getHistory()[-LLM_LOOP_CHECK_HISTORY_COUNT:]
 
-        prompt = ("You are a sophisticated AI diagnostic agent specializing in identifying when a conversational AI is stuck in an unproductive state. Your task is to analyze the provided conversation history and determine if the assistant has ceased to make meaningful progress.\n\n"
-                  "An unproductive state is characterized by one or more of the following patterns over the last 5 or more assistant turns:\n\n"
-                  "Repetitive Actions: The assistant repeats the same tool calls or conversational responses a decent number of times. This includes simple loops (e.g., tool_A, tool_A, tool_A) and alternating patterns (e.g., tool_A, tool_B, tool_A, tool_B, ...).\n\n"
-                  "Cognitive Loop: The assistant seems unable to determine the next logical step. It might express confusion, repeatedly ask the same questions, or generate responses that don't logically follow from the previous turns, indicating it's stuck and not advancing the task.\n\n"
-                  "Crucially, differentiate between a true unproductive state and legitimate, incremental progress."
-                  "For example, a series of 'tool_A' or 'tool_B' tool calls that make small, distinct changes to the same file (like adding docstrings to functions one by one) is considered forward progress and is NOT a loop. A loop would be repeatedly replacing the same text with the same content, or cycling between a small set of files with no net change.\n\n"
-                  "Please analyze the conversation history to determine the possibility that the conversation is stuck in a repetitive, non-productive state.")
-
-        contents = [*recent_history, {'role': 'user', 'parts': [{'text': prompt}]}]
-        schema = {
-            'type': 'object',
-            'properties': {
-                'reasoning': {
-                    'type': 'string',
-                    'description': 'Your reasoning on if the conversation is looping without forward progress.'
-                },
-                'confidence': {
-                    'type': 'number',
-                    'description': 'A number between 0.0 and 1.0 representing your confidence that the conversation is in an unproductive state.'
-                }
-            },
-            'required': ['reasoning', 'confidence']
-        }
+        contents = [*recent_history, {'role': 'user', 'parts': [{'text': _LLM_LOOP_CHECK_PROMPT}]}]
 
         try:
             result = await self.config.getGeminiClient().generateJson(
-                contents, schema, signal, DEFAULT_GEMINI_FLASH_MODEL
+                contents, _LLM_LOOP_CHECK_SCHEMA, signal, DEFAULT_GEMINI_FLASH_MODEL
             )
         except Exception as e:
             # 发生异常时，视为无循环
             if self.config.getDebugMode():
-                print(f"Error in LLM loop check: {e}")
+                self.log(logging.ERROR, f"Error in LLM loop check: {e}")
             return False
 
         if isinstance(result.get('confidence'), (int, float)):
             if result['confidence'] > 0.9:
                 if isinstance(result.get('reasoning'), str) and result['reasoning']:
-                    print(f"Warning: Possible loop detected: {result['reasoning']}")
+                    self.log(logging.WARNING, f"Possible loop detected: {result['reasoning']}")
                 logLoopDetected(
                     self.config,
                     LoopDetectedEvent(LoopType.LLM_DETECTED_LOOP, self.prompt_id)
@@ -291,6 +474,24 @@ class LoopDetectionService:
                 )
         return False
 
+    def log(self, level: int, message: str) -> None:
+        self.log_queue.put_nowait((level, message))
+        if self.log_task is not None and not self.log_task.done():
+            return
+        try:
+            self.log_task = asyncio.get_running_loop().create_task(self.drain_log_queue())
+        except RuntimeError:
+            # 没有运行中的事件循环时直接写出
+            self.drain_log_queue_now()
+
+    async def drain_log_queue(self) -> None:
+        self.drain_log_queue_now()
+
+    def drain_log_queue_now(self) -> None:
+        while not self.log_queue.empty():
+            level, message = self.log_queue.get_nowait()
+            logger.log(level, message)
+
     def reset(self, prompt_id: str) -> None:
         self.prompt_id = prompt_id
         self.reset_tool_call_count()
@@ -303,12 +504,23 @@ class LoopDetectionService:
         self.tool_call_repetition_count = 0
 
     def reset_content_tracking(self, reset_history: bool = True) -> None:
+        self.pending_content.clear()
+        self.pending_content_length = 0
         if reset_history:
-            self.stream_content_history = ''
+            del self.stream_content_history[:]
+            self.history_base_offset = 0
+            self.history_start = 0
         self.content_stats.clear()
-        self.last_content_index = 0
+        self.hot_chunks.clear()
+        self.last_content_index = self.history_start
+        self.last_chunk_hash = None
 
     def reset_llm_check_tracking(self) -> None:
+        if self.llm_check_task is not None and not self.llm_check_task.done():
+            self.llm_check_task.cancel()
+        self.llm_check_task = None
+        self.llm_loop_detected = False
+        self.llm_check_generation += 1
         self.turns_in_current_prompt = 0
         self.llm_check_interval = DEFAULT_LLM_CHECK_INTERVAL
         self.last_check_turn = 0
\ No newline at end of file
@@ -1,19 +1,25 @@
 import asyncio
+import codecs
 import os
 import signal
 import subprocess
 from typing import Dict, List, Optional, Callable, Any, Union, Tuple
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from ..utils.system_encoding import get_cached_encoding_for_buffer
 from ..utils.text_utils import is_binary
 
 SIGKILL_TIMEOUT_MS = 200
+MAX_SNIFF_SIZE = 4096
+READ_CHUNK_SIZE = 8192
+# 检测到二进制输出后，raw_output 最多保留的字节数
+MAX_RAW_OUTPUT_BYTES = 64 * 1024 * 1024
 
 
 @dataclass
 class ShellExecutionResult:
     """A structured result from a shell command execution."""
+    # 原始输出字节；二进制输出超过 max_raw_output_bytes 后不再保留，此时 truncated 为 True
     raw_output: bytes
     output: str
     stdout: str
@@ -23,6 +29,7 @@ class ShellExecutionResult:
     error: Optional[Exception]
     aborted: bool
     pid: Optional[int]
+    truncated: bool = False
 
 
 @dataclass
@@ -47,6 +54,106 @@ class ShellOutputEvent:
     bytes_received: Optional[int] = None  # For BINARY_PROGRESS type
 
 
+@dataclass
+class _OutputState:
+    """stdout 与 stderr 读取协程共享的输出状态"""
+    on_output_event: Callable[[ShellOutputEvent], None]
+    max_raw_output_bytes: int = MAX_RAW_OUTPUT_BYTES
+    chunks: List[bytes] = field(default_factory=list)
+    truncated: bool = False
+    # 已接收的总字节数，随 chunks 追加递增，避免每次求和
+    total_bytes: int = 0
+    is_streaming_raw_content: bool = True
+    # 二进制嗅探缓冲区：增量累积输出开头的字节，达到上限后不再增长
+    sniff_buf: bytearray = field(default_factory=bytearray)
+    sniff_chunks: int = 0
+    sniff_done: bool = False
+
+    def check_binary(self, chunk: bytes) -> None:
+        """Check for binary content in the first chunks
+
+        调用方需确保 is_streaming_raw_content 为真且 sniff_done 为假。
+        """
+        self.sniff_buf.extend(chunk[:MAX_SNIFF_SIZE - len(self.sniff_buf)])
+        self.sniff_chunks += 1
+        # 嗅探前 20 个块或前 MAX_SNIFF_SIZE 字节，之后不再检测
+        if len(self.sniff_buf) >= MAX_SNIFF_SIZE or self.sniff_chunks >= 20:
+            self.sniff_done = True
+
+        if is_binary(bytes(self.sniff_buf)):
+            self.is_streaming_raw_content = False
+            self.on_output_event(ShellOutputEvent(
+                type=ShellOutputEventType.BINARY_DETECTED
+            ))
+
+
+@dataclass
+class _StreamState:
+    """单个输出流（stdout 或 stderr）的读取状态"""
+    label: str
+    output: _OutputState
+    # 解码后的文本片段，结束时一次性拼接，避免逐块 += 的二次复制
+    text_parts: List[str] = field(default_factory=list)
+    decoder: Optional[codecs.IncrementalDecoder] = None
+
+    def get_text(self) -> str:
+        return ''.join(self.text_parts)
+
+    def emit_text(self, decoded_chunk: str) -> None:
+        if decoded_chunk:
+            self.text_parts.append(decoded_chunk)
+            self.output.on_output_event(ShellOutputEvent(
+                type=ShellOutputEventType.DATA,
+                stream=self.label,
+                chunk=decoded_chunk
+            ))
+
+
+def _create_decoder(first_chunk: bytes) -> codecs.IncrementalDecoder:
+    """根据首个数据块确定编码，返回可跨块保留未完成多字节序列的增量解码器"""
+    encoding = 'utf-8'
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(first_chunk)
+    except UnicodeDecodeError:
+        encoding = get_cached_encoding_for_buffer(first_chunk)
+    try:
+        return codecs.getincrementaldecoder(encoding)(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+
+async def _read_stream(reader: asyncio.StreamReader, state: _StreamState) -> None:
+    """读取一个输出流直到 EOF，解码文本并发出输出事件"""
+    output = state.output
+    while True:
+        chunk = await reader.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        output.total_bytes += len(chunk)
+        # 检测到二进制或嗅探完成后，每个块都不再进入 check_binary
+        if output.is_streaming_raw_content and not output.sniff_done:
+            output.check_binary(chunk)
+        # 二进制输出超过上限后只计数不再缓存，避免超大输出占满内存
+        if output.is_streaming_raw_content or output.total_bytes <= output.max_raw_output_bytes:
+            output.chunks.append(chunk)
+        else:
+            output.truncated = True
+
+        if output.is_streaming_raw_content:
+            if state.decoder is None:
+                state.decoder = _create_decoder(chunk)
+            state.emit_text(state.decoder.decode(chunk))
+        else:
+            output.on_output_event(ShellOutputEvent(
+                type=ShellOutputEventType.BINARY_PROGRESS,
+                bytes_received=output.total_bytes
+            ))
+
+    # 输出结束时刷出解码器中残留的不完整字节序列
+    if output.is_streaming_raw_content and state.decoder is not None:
+        state.emit_text(state.decoder.decode(b'', final=True))
+
+
 class ShellExecutionService:
     """
     A centralized service for executing shell commands with robust process
@@ -59,6 +166,7 @@ class ShellExecutionService:
         cwd: str,
         on_output_event: Callable[[ShellOutputEvent], None],
         abort_signal: asyncio.Event,
+        max_raw_output_bytes: int = MAX_RAW_OUTPUT_BYTES,
     ) -> ShellExecutionHandle:
         """
         Executes a shell command using subprocess, capturing all output and lifecycle events.
@@ -68,6 +176,8 @@ class ShellExecutionService:
             cwd: The working directory to execute the command in.
             on_output_event: A callback for streaming structured events.
             abort_signal: An Event to signal termination of the process.
+            max_raw_output_bytes: Once the output is detected as binary, stop
+                retaining raw bytes beyond this size and mark the result truncated.
 
         Returns:
             An object containing the process ID (pid) and a future that
@@ -79,144 +189,46 @@ class ShellExecutionService:
         env = os.environ.copy()
         env['GEMINI_CLI'] = '1'
 
-        # Determine shell to use
-        shell = True
-        if not is_windows:
-            shell = '/bin/bash'
-
         # Create a future to hold the result
         result_future = asyncio.Future()
 
         try:
-            # Start the subprocess
-            process = subprocess.Popen(
-                command_to_execute,
-                cwd=cwd,
-                stdin=subprocess.DEVNULL,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                shell=shell,
-                env=env,
-                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if is_windows else 0,
-                text=False  # We'll handle decoding manually
-            )
+            # Start the subprocess; pipes are read natively on the event loop
+            # and decoding is handled manually
+            if is_windows:
+                process = await asyncio.create_subprocess_shell(
+                    command_to_execute,
+                    cwd=cwd,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    env=env,
+                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+                )
+            else:
+                # Run under bash in its own session so abort can kill the whole group
+                process = await asyncio.create_subprocess_exec(
+                    '/bin/bash', '-c', command_to_execute,
+                    cwd=cwd,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    env=env,
+                    start_new_session=True
+                )
 
             # Create handle with pid and result future
             handle = ShellExecutionHandle(pid=process.pid, result=result_future)
 
             # Setup output handling
-            stdout_buffer: List[bytes] = []
-            stderr_buffer: List[bytes] = []
-            output_chunks: List[bytes] = []
-            stdout_str = ''
-            stderr_str = ''
+            output = _OutputState(
+                on_output_event=on_output_event,
+                max_raw_output_bytes=max_raw_output_bytes
+            )
+            stdout_state = _StreamState(label='stdout', output=output)
+            stderr_state = _StreamState(label='stderr', output=output)
             error: Optional[Exception] = None
             exited = False
-            is_streaming_raw_content = True
-            MAX_SNIFF_SIZE = 4096
-            sniffed_bytes = 0
-            stdout_encoding = 'utf-8'
-            stderr_encoding = 'utf-8'
-
-            # Check for binary content in the first chunks
-            def check_binary(buffer: bytes) -> None:
-                nonlocal is_streaming_raw_content, sniffed_bytes
-                if is_streaming_raw_content and sniffed_bytes < MAX_SNIFF_SIZE:
-                    sniff_buffer = b''.join(output_chunks[:20])
-                    sniffed_bytes = len(sniff_buffer)
-
-                    if ShellExecutionService.is_binary(sniff_buffer):
-                        is_streaming_raw_content = False
-                        on_output_event(ShellOutputEvent(
-                            type=ShellOutputEventType.BINARY_DETECTED
-                        ))
-
-            # Read stdout and stderr asynchronously
-            async def read_stdout():
-                nonlocal stdout_str, stdout_encoding
-                while True:
-                    chunk = await asyncio.to_thread(process.stdout.read1, 8192)
-                    if not chunk:
-                        break
-                    stdout_buffer.append(chunk)
-                    output_chunks.append(chunk)
-                    check_binary(chunk)
-
-                    if is_streaming_raw_content:
-                        try:
-                            decoded_chunk = chunk.decode(stdout_encoding)
-                            stdout_str += decoded_chunk
-                            on_output_event(ShellOutputEvent(
-                                type=ShellOutputEventType.DATA,
-                                stream='stdout',
-                                chunk=decoded_chunk
-                            ))
-                        except UnicodeDecodeError:
-                            # If decoding fails, try to detect encoding
-                            stdout_encoding = ShellExecutionService.get_cached_encoding_for_buffer(chunk)
-                            try:
-                                decoded_chunk = chunk.decode(stdout_encoding)
-                                stdout_str += decoded_chunk
-                                on_output_event(ShellOutputEvent(
-                                    type=ShellOutputEventType.DATA,
-                                    stream='stdout',
-                                    chunk=decoded_chunk
-                                ))
-                            except UnicodeDecodeError:
-                                # If still failing, mark as binary
-                                is_streaming_raw_content = False
-                                on_output_event(ShellOutputEvent(
-                                    type=ShellOutputEventType.BINARY_DETECTED
-                                ))
-                    else:
-                        total_bytes = sum(len(c) for c in output_chunks)
-                        on_output_event(ShellOutputEvent(
-                            type=ShellOutputEventType.BINARY_PROGRESS,
-                            bytes_received=total_bytes
-                        ))
-
-            async def read_stderr():
-                nonlocal stderr_str, stderr_encoding
-                while True:
-                    chunk = await asyncio.to_thread(process.stderr.read1, 8192)
-                    if not chunk:
-                        break
-                    stderr_buffer.append(chunk)
-                    output_chunks.append(chunk)
-                    check_binary(chunk)
-
-                    if is_streaming_raw_content:
-                        try:
-                            decoded_chunk = chunk.decode(stderr_encoding)
-                            stderr_str += decoded_chunk
-                            on_output_event(ShellOutputEvent(
-                                type=ShellOutputEventType.DATA,
-                                stream='stderr',
-                                chunk=decoded_chunk
-                            ))
-                        except UnicodeDecodeError:
-                            # If decoding fails, try to detect encoding
-                            stderr_encoding = ShellExecutionService.get_cached_encoding_for_buffer(chunk)
-                            try:
-                                decoded_chunk = chunk.decode(stderr_encoding)
-                                stderr_str += decoded_chunk
-                                on_output_event(ShellOutputEvent(
-                                    type=ShellOutputEventType.DATA,
-                                    stream='stderr',
-                                    chunk=decoded_chunk
-                                ))
-                            except UnicodeDecodeError:
-                                # If still failing, mark as binary
-                                is_streaming_raw_content = False
-                                on_output_event(ShellOutputEvent(
-                                    type=ShellOutputEventType.BINARY_DETECTED
-                                ))
-                    else:
-                        total_bytes = sum(len(c) for c in output_chunks)
-                        on_output_event(ShellOutputEvent(
-                            type=ShellOutputEventType.BINARY_PROGRESS,
-                            bytes_received=total_bytes
-                        ))
 
             # Setup abort handling
             async def handle_abort():
@@ -246,12 +258,12 @@ class ShellExecutionService:
                                 process.kill()
 
             # Start reading output and abort handling
-            stdout_task = asyncio.create_task(read_stdout())
-            stderr_task = asyncio.create_task(read_stderr())
+            stdout_task = asyncio.create_task(_read_stream(process.stdout, stdout_state))
+            stderr_task = asyncio.create_task(_read_stream(process.stderr, stderr_state))
             abort_task = asyncio.create_task(handle_abort())
 
             # Wait for process to exit
-            exit_code = await asyncio.to_thread(process.wait)
+            exit_code = await process.wait()
             exited = True
 
             # Cancel abort task since process has exited
@@ -261,21 +273,22 @@ class ShellExecutionService:
             await asyncio.gather(stdout_task, stderr_task, return_exceptions=True)
 
             # Prepare final result
-            raw_output = b''.join(output_chunks)
-            output = stdout_str
-            if stderr_str:
-                output += f'\n{stderr_str}'
+            raw_output = b''.join(output.chunks)
+            stdout_str = stdout_state.get_text()
+            stderr_str = stderr_state.get_text()
+            combined_output = stdout_str if not stderr_str else ''.join((stdout_str, '\n', stderr_str))
 
             result = ShellExecutionResult(
                 raw_output=raw_output,
-                output=output,
+                output=combined_output,
                 stdout=stdout_str,
                 stderr=stderr_str,
                 exit_code=exit_code,
                 signal=None,  # Python doesn't provide signal that killed the process
                 error=error,
                 aborted=abort_signal.is_set(),
-                pid=process.pid
+                pid=process.pid,
+                truncated=output.truncated
             )
 
             # Resolve the future with the result
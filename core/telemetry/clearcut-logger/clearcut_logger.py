@@ -1,15 +1,28 @@
+import collections
+import itertools
 import json
+import random
 import time
 import asyncio
-import requests
+import aiohttp
+import queue
 import threading
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Tuple
 from dataclasses import dataclass
+from enum import Enum
 from aiohttp_socks import ProxyConnector
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from ..types import (ApiErrorEvent, FlashFallbackEvent, NextSpeakerCheckEvent, StartSessionEvent, EndSessionEvent,
     UserPromptEvent,ToolCallEvent,ApiRequestEvent,ApiResponseEvent,
     ApiErrorEvent,FlashFallbackEvent,LoopDetectedEvent,NextSpeakerCheckEvent,SlashCommandEvent,MalformedJsonResponseEvent)
+from .event_metadata_key import EventMetadataKey
+
+_time_ns = time.time_ns
 
 # 常量定义
 start_session_event_name = 'start_session'
@@ -25,6 +38,46 @@ next_speaker_check_event_name = 'next_speaker_check'
 slash_command_event_name = 'slash_command'
 malformed_json_response_event_name = 'malformed_json_response'
 
+def _dumps(value: Any) -> str:
+    """序列化为 JSON 字符串，orjson 可用时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def _dumps_bytes(value: Any) -> bytes:
+    """序列化为 UTF-8 编码的 JSON 字节串，可直接作为请求体发送"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode('utf-8')
+
+def _scalar(value: Any) -> str:
+    """将元数据值转为字符串；标量直接转换，仅 dict/list 等容器走 JSON 序列化"""
+    if isinstance(value, Enum):
+        value = value.value
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return _dumps(value)
+
+def _metadata_keys(*keys: EventMetadataKey) -> Tuple[int, ...]:
+    """取出元数据键的整数值，载荷中直接使用 int 而不是 Enum 成员"""
+    return tuple(key.value for key in keys)
+
+
+GEMINI_CLI_GOOGLE_ACCOUNTS_COUNT = EventMetadataKey.GEMINI_CLI_GOOGLE_ACCOUNTS_COUNT.value
+
+# worker 队列中的控制标记
+_FLUSH = object()
+_STOP = object()
+
 class LogResponse:
     def __init__(self, next_request_wait_ms: Optional[int] = None):
         self.next_request_wait_ms = next_request_wait_ms
@@ -33,8 +86,101 @@ class LogResponse:
 class ClearcutLogger:
     _instance: Optional['ClearcutLogger'] = None
     _lock = threading.Lock()
+    _MAX_QUEUED_EVENTS = 4096
+    _REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+    _MAX_RETRY_DELAY_MS = 30_000
+    # 排队事件的序列化大小超过该值时提前刷新
+    _FLUSH_SIZE_THRESHOLD = 64_000
+    # 连续刷新失败后的退避上限（秒）；退避期间积压再大也不提前刷新
+    _MAX_FAILURE_BACKOFF_S = 30 * 60
+    _SHUTDOWN_TIMEOUT_S = 10
+
+    # 各事件元数据键（整数值）的固定顺序，与 log_* 方法中的值一一对应
+    _START_SESSION_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_START_SESSION_MODEL,
+        EventMetadataKey.GEMINI_CLI_SESSION_ID,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_EMBEDDING_MODEL,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_SANDBOX,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_CORE_TOOLS,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_APPROVAL_MODE,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_API_KEY_ENABLED,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_VERTEX_API_ENABLED,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_DEBUG_MODE_ENABLED,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_MCP_SERVERS,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_TELEMETRY_ENABLED,
+        EventMetadataKey.GEMINI_CLI_START_SESSION_TELEMETRY_LOG_USER_PROMPTS_ENABLED,
+        EventMetadataKey.GEMINI_CLI_SURFACE,
+    )
+    _NEW_PROMPT_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_USER_PROMPT_LENGTH,
+        EventMetadataKey.GEMINI_CLI_SESSION_ID,
+        EventMetadataKey.GEMINI_CLI_PROMPT_ID,
+        EventMetadataKey.GEMINI_CLI_AUTH_TYPE,
+    )
+    _TOOL_CALL_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_TOOL_CALL_NAME,
+        EventMetadataKey.GEMINI_CLI_PROMPT_ID,
+        EventMetadataKey.GEMINI_CLI_TOOL_CALL_DECISION,
+        EventMetadataKey.GEMINI_CLI_TOOL_CALL_SUCCESS,
+        EventMetadataKey.GEMINI_CLI_TOOL_CALL_DURATION_MS,
+        EventMetadataKey.GEMINI_CLI_TOOL_ERROR_MESSAGE,
+        EventMetadataKey.GEMINI_CLI_TOOL_CALL_ERROR_TYPE,
+    )
+    _API_REQUEST_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_API_REQUEST_MODEL,
+        EventMetadataKey.GEMINI_CLI_PROMPT_ID,
+    )
+    _API_RESPONSE_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_API_RESPONSE_MODEL,
+        EventMetadataKey.GEMINI_CLI_PROMPT_ID,
+        EventMetadataKey.GEMINI_CLI_API_RESPONSE_STATUS_CODE,
+        EventMetadataKey.GEMINI_CLI_API_RESPONSE_DURATION_MS,
+        EventMetadataKey.GEMINI_CLI_API_ERROR_MESSAGE,
+        EventMetadataKey.GEMINI_CLI_API_RESPONSE_INPUT_TOKEN_COUNT,
+        EventMetadataKey.GEMINI_CLI_API_RESPONSE_OUTPUT_TOKEN_COUNT,
+        EventMetadataKey.GEMINI_CLI_API_RESPONSE_CACHED_TOKEN_COUNT,
+        EventMetadataKey.GEMINI_CLI_API_RESPONSE_THINKING_TOKEN_COUNT,
+        EventMetadataKey.GEMINI_CLI_API_RESPONSE_TOOL_TOKEN_COUNT,
+        EventMetadataKey.GEMINI_CLI_AUTH_TYPE,
+    )
+    _API_ERROR_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_API_ERROR_MODEL,
+        EventMetadataKey.GEMINI_CLI_PROMPT_ID,
+        EventMetadataKey.GEMINI_CLI_API_ERROR_TYPE,
+        EventMetadataKey.GEMINI_CLI_API_ERROR_STATUS_CODE,
+        EventMetadataKey.GEMINI_CLI_API_ERROR_DURATION_MS,
+        EventMetadataKey.GEMINI_CLI_AUTH_TYPE,
+    )
+    _FLASH_FALLBACK_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_AUTH_TYPE,
+        EventMetadataKey.GEMINI_CLI_SESSION_ID,
+    )
+    _LOOP_DETECTED_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_PROMPT_ID,
+        EventMetadataKey.GEMINI_CLI_LOOP_DETECTED_TYPE,
+    )
+    _NEXT_SPEAKER_CHECK_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_PROMPT_ID,
+        EventMetadataKey.GEMINI_CLI_RESPONSE_FINISH_REASON,
+        EventMetadataKey.GEMINI_CLI_NEXT_SPEAKER_CHECK_RESULT,
+        EventMetadataKey.GEMINI_CLI_SESSION_ID,
+    )
+    _SLASH_COMMAND_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_SLASH_COMMAND_NAME,
+        EventMetadataKey.GEMINI_CLI_SLASH_COMMAND_SUBCOMMAND,
+    )
+    _MALFORMED_JSON_RESPONSE_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_MALFORMED_JSON_RESPONSE_MODEL,
+    )
+    _END_SESSION_KEYS = _metadata_keys(
+        EventMetadataKey.GEMINI_CLI_SESSION_ID,
+    )
 
     def __new__(cls, config: Optional[Config] = None):
+        # 已初始化时直接返回，只有首次创建才需要加锁（双重检查）
+        instance = cls._instance
+        if instance is not None:
+            return instance
         with cls._lock:
             if cls._instance is None:
                 if config is None or not config.getUsageStatisticsEnabled():
@@ -45,29 +191,47 @@ class ClearcutLogger:
 
     def _initialize(self, config: Config):
         self.config = config
-        self.events: List[Any] = []
-        self.last_flush_time = time.time()
+        # 以下信息在日志器生命周期内不变，只查询一次
+        self._session_id = config.get_session_id() or ''
+        self._email = self._get_cached_google_account()
+        self._accounts_count_str = str(self._get_lifetime_google_accounts())
+        # 应该记录电子邮件或安装 ID，而不是两者都记录
+        self._install_id = None if self._email else self._get_installation_id()
+        # 有界队列，发送失败积压过多时丢弃最旧的事件
+        self.events: collections.deque = collections.deque(maxlen=self._MAX_QUEUED_EVENTS)
+        self._pending_bytes = 0
+        self.last_flush_time = time.monotonic()
         self.flush_interval_ms = 1000 * 60  # 至少等待一分钟后刷新事件
+        # 服务端通过 next_request_wait_ms 要求的最早下次刷新时间（monotonic）
+        self._next_flush_allowed = 0.0
+        self._consecutive_flush_failures = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        # log_* 只把事件放入队列；序列化与刷新都在后台 worker 线程及其事件循环中进行
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._worker_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker = threading.Thread(target=self._run_worker, name='clearcut-logger', daemon=True)
+        self._worker.start()
 
     @staticmethod
     def getInstance(config: Optional[Config] = None) -> Optional['ClearcutLogger']:
         if config is None or not config.getUsageStatisticsEnabled():
             return None
-        return ClearcutLogger(config)
+        return ClearcutLogger._instance or ClearcutLogger(config)
 
     def enqueue_log_event(self, event: Dict[str, Any]) -> None:
-        self.events.append([{
-            'event_time_ms': int(time.time() * 1000),
-            'source_extension_json': json.dumps(event)
-        }])
-
-    def create_log_event(self, name: str, data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        # 模拟 getCachedGoogleAccount 和 getLifetimeGoogleAccounts 函数
-        email = self._get_cached_google_account()
-        total_accounts = self._get_lifetime_google_accounts()
+        # 入队时即把事件序列化为 source_extension_json 的 JSON 字符串字面量（字节），
+        # 刷新时直接拼接进请求体，不再整体重新编码
+        source_extension_json = _dumps_bytes(_dumps(event))
+        self.events.append((_time_ns() // 1_000_000, source_extension_json))
+        self._pending_bytes += len(source_extension_json)
+
+    def create_log_event(self, name: str, keys: Tuple[int, ...], values: tuple) -> Dict[str, Any]:
+        # 元数据以并行的键、值元组传入，只在这里展开为一次性的字典列表
+        data = [{'gemini_cli_key': k, 'value': v} for k, v in zip(keys, values)]
         data.append({
-            'gemini_cli_key': EventMetadataKey.GEMINI_CLI_GOOGLE_ACCOUNTS_COUNT,
-            'value': str(total_accounts)
+            'gemini_cli_key': GEMINI_CLI_GOOGLE_ACCOUNTS_COUNT,
+            'value': self._accounts_count_str
         })
 
         log_event = {
@@ -77,35 +241,95 @@ class ClearcutLogger:
             'event_metadata': [data]
         }
 
-        # 应该记录电子邮件或安装 ID，而不是两者都记录
-        if email:
-            log_event['client_email'] = email
+        if self._email:
+            log_event['client_email'] = self._email
         else:
-            log_event['client_install_id'] = self._get_installation_id()
+            log_event['client_install_id'] = self._install_id
 
         return log_event
 
+    def _run_worker(self) -> None:
+        """worker 线程主循环：处理排队的事件，按时间或积压大小刷新"""
+        loop = asyncio.new_event_loop()
+        self._worker_loop = loop
+        try:
+            while True:
+                timeout = max(
+                    self.last_flush_time + self.flush_interval_ms / 1000, self._next_flush_allowed
+                ) - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(0.0, timeout))
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    self._flush_now()
+                    break
+                if item is _FLUSH:
+                    self._flush_now()
+                    continue
+                if item is not None:
+                    record, event = item
+                    try:
+                        record(self, event)
+                    except Exception as error:
+                        if self.config.getDebugMode():
+                            logger.error(f'Failed to record Clearcut event: {error}')
+                self.flush_if_needed()
+        finally:
+            loop.run_until_complete(self.close_session())
+            loop.close()
+
     def flush_if_needed(self) -> None:
-        if time.time() - self.last_flush_time < self.flush_interval_ms / 1000:
+        """在 worker 线程中调用：到达刷新间隔或积压超过阈值时刷新"""
+        now = time.monotonic()
+        if now < self._next_flush_allowed:
+            return
+        if (
+            self._pending_bytes <= self._FLUSH_SIZE_THRESHOLD
+            and now - self.last_flush_time < self.flush_interval_ms / 1000
+        ):
             return
+        self._flush_now()
 
-        asyncio.run(self.flush_to_clearcut())
+    def _flush_now(self) -> None:
+        self._worker_loop.run_until_complete(self.flush_to_clearcut())
+        # 无论成功与否都推迟下一次定时刷新，避免失败时反复重试
+        self.last_flush_time = time.monotonic()
 
     async def flush_to_clearcut(self) -> LogResponse:
         if self.config.getDebugMode():
             logger.info('Flushing log events to Clearcut.')
-        events_to_send = self.events.copy()
-        if not events_to_send:
+        if not self.events:
             return LogResponse()
+        # 换入新队列而不是复制，发送期间记录的事件进入新队列
+        events_to_send = self.events
+        self.events = collections.deque(maxlen=self._MAX_QUEUED_EVENTS)
+        self._pending_bytes = 0
 
         try:
             response_buffer = await self._retry_with_backoff(self._make_flush_request, events_to_send)
-            self.events = []
-            self.last_flush_time = time.time()
-            return self._decode_log_response(response_buffer) or LogResponse()
+            self.last_flush_time = time.monotonic()
+            response = self._decode_log_response(response_buffer) or LogResponse()
+            self._consecutive_flush_failures = 0
+            if response.next_request_wait_ms:
+                self._next_flush_allowed = self.last_flush_time + response.next_request_wait_ms / 1000
+            return response
         except Exception as error:
             if self.config.getDebugMode():
                 logger.error(f'Clearcut flush failed after multiple retries: {error}')
+            # 发送失败的事件放回队首，下次刷新时重试；超出上限时同样丢弃最旧的事件
+            self.events = collections.deque(
+                itertools.chain(events_to_send, self.events), maxlen=self._MAX_QUEUED_EVENTS
+            )
+            self._pending_bytes = sum(len(source_extension_json) for _, source_extension_json in self.events)
+            # 按连续失败次数指数退避，避免离线时每个新事件都因积压超限触发一轮重试
+            self._consecutive_flush_failures += 1
+            backoff_s = min(
+                self.flush_interval_ms / 1000 * 2 ** min(self._consecutive_flush_failures - 1, 10),
+                self._MAX_FAILURE_BACKOFF_S,
+            )
+            self._next_flush_allowed = time.monotonic() + backoff_s
             return LogResponse()
 
     async def _retry_with_backoff(self, func, *args, max_attempts=3, initial_delay_ms=200):
@@ -122,9 +346,11 @@ class ClearcutLogger:
                 if not self._should_retry(error):
                     raise
 
-                delay = initial_delay_ms * (2 ** (attempts - 1))
+                # 指数退避加随机抖动，避免大量客户端同时重试
+                delay = min(self._MAX_RETRY_DELAY_MS, initial_delay_ms * (2 ** (attempts - 1)))
+                delay *= 0.5 + random.random()
                 if self.config.getDebugMode():
-                    logger.info(f'Retrying Clearcut flush after {delay}ms due to error: {error}')
+                    logger.info(f'Retrying Clearcut flush after {delay:.0f}ms due to error: {error}')
                 await asyncio.sleep(delay / 1000)
 
     def _should_retry(self, error: Exception) -> bool:
@@ -135,372 +361,262 @@ class ClearcutLogger:
         # 网络错误也重试
         return True
 
-    async def _make_flush_request(self, events_to_send: List[Any]) -> bytes:
-        request = [{
-            'log_source_name': 'CONCORD',
-            'request_time_ms': int(time.time() * 1000),
-            'log_event': events_to_send
-        }]
-        body = json.dumps(request)
+    @staticmethod
+    def _build_request_body(events_to_send: collections.deque) -> bytearray:
+        """拼接请求体，等价于序列化
+        [{'log_source_name': 'CONCORD', 'request_time_ms': ...,
+          'log_event': [[{'event_time_ms': ..., 'source_extension_json': ...}], ...]}]
+        """
+        body = bytearray(b'[{"log_source_name":"CONCORD","request_time_ms":')
+        body += str(_time_ns() // 1_000_000).encode()
+        body += b',"log_event":['
+        for i, (event_time_ms, source_extension_json) in enumerate(events_to_send):
+            if i:
+                body += b','
+            body += b'[{"event_time_ms":'
+            body += str(event_time_ms).encode()
+            body += b',"source_extension_json":'
+            body += source_extension_json
+            body += b'}]'
+        body += b']}]'
+        return body
+
+    async def _make_flush_request(self, events_to_send: collections.deque) -> bytes:
+        body = self._build_request_body(events_to_send)
 
         headers = {'Content-Length': str(len(body))}
-        proxies = None
-        proxy_url = self.config.getProxy()
-        if proxy_url:
-            if proxy_url.startswith('http'):
-                proxies = {'https': proxy_url}
-            else:
-                raise ValueError('Unsupported proxy type')
-
-        # 使用 aiohttp 或 requests? 这里为了简化使用 requests，但在实际异步环境中应使用 aiohttp
-        # 注意：requests 不支持真正的异步，这里只是模拟
-        response = requests.post(
-            url='https://play.googleapis.com/log',
-            data=body,
-            headers=headers,
-            proxies=proxies
-        )
-
-        if response.status_code < 200 or response.status_code >= 300:
-            raise HttpError(f'Request failed with status {response.status_code}', response.status_code)
-
-        return response.content
+        # 代理在创建会话时由 get_proxy_agent 配置
+        session = await self._get_session()
+        async with session.post('https://play.googleapis.com/log', data=body, headers=headers) as response:
+            if response.status < 200 or response.status >= 300:
+                raise HttpError(f'Request failed with status {response.status}', response.status)
+            return await response.read()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取发送日志用的 aiohttp 会话，必要时（首次使用或事件循环变化）重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = self.get_proxy_agent() or aiohttp.ClientSession(
+                # 单连接并在两次定时刷新之间保持存活，后续刷新复用同一 TLS 连接
+                connector=aiohttp.TCPConnector(
+                    limit=1, keepalive_timeout=self.flush_interval_ms / 1000 + 15
+                ),
+                timeout=self._REQUEST_TIMEOUT
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def close_session(self) -> None:
+        """关闭发送日志用的 HTTP 会话"""
+        session = self._session
+        self._session = None
+        self._session_loop = None
+        if session is not None and not session.closed:
+            await session.close()
 
     def _decode_log_response(self, buf: bytes) -> Optional[LogResponse]:
-        if len(buf) < 1:
+        n = len(buf)
+        # 第一个字节是 `field<<3 | type`。我们要找的是字段 1，类型为 varint，由 type=0 表示
+        if n < 2 or buf[0] != 8:
             return None
 
-        # 第一个字节是 `field<<3 | type`。我们要找的是字段 1，类型为 varint，由 type=0 表示
-        if buf[0] != 8:
+        # 快速路径：next_request_wait_ms 通常只占 1~2 个字节
+        b1 = buf[1]
+        if b1 < 0x80:
+            return LogResponse(next_request_wait_ms=b1)
+        if n < 3:
             return None
+        b2 = buf[2]
+        if b2 < 0x80:
+            return LogResponse(next_request_wait_ms=(b1 & 0x7f) | (b2 << 7))
 
+        # 在每个字节中，最高位是连续位。如果设置了，我们继续。最低7位是数据位。
+        # 64 位 varint 最多 10 个字节，超出即视为格式错误，不再扫描剩余数据
         ms = 0
-        cont = True
-
-        # 在每个字节中，最高位是连续位。如果设置了，我们继续。最低7位是数据位
-        for i in range(1, len(buf)):
-            if not cont:
-                break
-            byte = [i]
-            ms |= (byte & 0x7f) << (7 * (i - 1))
-            cont = (byte & 0x80) != 0
+        shift = 0
+        for byte in memoryview(buf)[1:11]:
+            ms |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return LogResponse(next_request_wait_ms=ms)
+            shift += 7
 
-        if cont:
-            return None
-
-        return_val = {"nextRequestWaitMs": int(ms)}
-        return return_val
+        # varint 未结束
+        return None
 
+    # 以下方法在调用方线程中只做入队，事件由 worker 线程构建和发送
     def log_start_session_event(self, event: StartSessionEvent) -> None:
-        surface = "CLOUD_SHELL" if os.environ.get('CLOUD_SHELL') == 'true' else (os.environ.get('SURFACE') or "SURFACE_NOT_SET")
+        self._queue.put((ClearcutLogger._record_start_session_event, event))
 
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_MODEL,
-                "value": event.model,
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_SESSION_ID,
-                "value": self.config.get_session_id() if self.config else "",
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_EMBEDDING_MODEL,
-                "value": event.embedding_model,
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_SANDBOX,
-                "value": str(event.sandbox_enabled),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_CORE_TOOLS,
-                "value": event.core_tools_enabled,
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_APPROVAL_MODE,
-                "value": event.approval_mode,
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_API_KEY_ENABLED,
-                "value": str(event.api_key_enabled),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_VERTEX_API_ENABLED,
-                "value": str(event.vertex_ai_enabled),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_DEBUG_MODE_ENABLED,
-                "value": str(event.debug_enabled),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_MCP_SERVERS,
-                "value": event.mcp_servers,
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_TELEMETRY_ENABLED,
-                "value": str(event.telemetry_enabled),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_START_SESSION_TELEMETRY_LOG_USER_PROMPTS_ENABLED,
-                "value": str(event.telemetry_log_user_prompts_enabled),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_SURFACE,
-                "value": surface,
-            },
-        ]
-    
     def log_new_prompt_event(self, event: UserPromptEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_USER_PROMPT_LENGTH,
-                "value": json.dumps(event.prompt_length),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_SESSION_ID,
-                "value": self.config.get_session_id() if self.config else "",
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_PROMPT_ID,
-                "value": json.dumps(event.prompt_id),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_AUTH_TYPE,
-                "value": json.dumps(event.auth_type),
-            },
-        ]
-
-        self.enqueue_log_event(self.create_log_event(new_prompt_event_name, data))
-        self.flush_if_needed()
+        self._queue.put((ClearcutLogger._record_new_prompt_event, event))
 
     def log_tool_call_event(self, event: ToolCallEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_TOOL_CALL_NAME,
-                "value": json.dumps(event.function_name),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_PROMPT_ID,
-                "value": json.dumps(event.prompt_id),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_TOOL_CALL_DECISION,
-                "value": json.dumps(event.decision),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_TOOL_CALL_SUCCESS,
-                "value": json.dumps(event.success),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_TOOL_CALL_DURATION_MS,
-                "value": json.dumps(event.duration_ms),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_TOOL_ERROR_MESSAGE,
-                "value": json.dumps(event.error),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_TOOL_CALL_ERROR_TYPE,
-                "value": json.dumps(event.error_type),
-            },
-        ]
-
-        log_event = self.create_log_event(tool_call_event_name, data)
-        self.enqueue_log_event(log_event)
-        self.flush_if_needed()
+        self._queue.put((ClearcutLogger._record_tool_call_event, event))
 
     def log_api_request_event(self, event: ApiRequestEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_REQUEST_MODEL,
-                "value": json.dumps(event.model),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_PROMPT_ID,
-                "value": json.dumps(event.prompt_id),
-            },
-        ]
-
-        self.enqueue_log_event(self.create_log_event(api_request_event_name, data))
-        self.flush_if_needed()
+        self._queue.put((ClearcutLogger._record_api_request_event, event))
 
     def log_api_response_event(self, event: ApiResponseEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_RESPONSE_MODEL,
-                "value": json.dumps(event.model),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_PROMPT_ID,
-                "value": json.dumps(event.prompt_id),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_RESPONSE_STATUS_CODE,
-                "value": json.dumps(event.status_code),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_RESPONSE_DURATION_MS,
-                "value": json.dumps(event.duration_ms),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_ERROR_MESSAGE,
-                "value": json.dumps(event.error),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_RESPONSE_INPUT_TOKEN_COUNT,
-                "value": json.dumps(event.input_token_count),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_RESPONSE_OUTPUT_TOKEN_COUNT,
-                "value": json.dumps(event.output_token_count),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_RESPONSE_CACHED_TOKEN_COUNT,
-                "value": json.dumps(event.cached_content_token_count),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_RESPONSE_THINKING_TOKEN_COUNT,
-                "value": json.dumps(event.thoughts_token_count),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_RESPONSE_TOOL_TOKEN_COUNT,
-                "value": json.dumps(event.tool_token_count),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_AUTH_TYPE,
-                "value": json.dumps(event.auth_type),
-            },
-        ]
-
-        self.enqueue_log_event(self.create_log_event(api_response_event_name, data))
-        self.flush_if_needed()
+        self._queue.put((ClearcutLogger._record_api_response_event, event))
 
     def log_api_error_event(self, event: ApiErrorEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_ERROR_MODEL,
-                "value": json.dumps(event.model),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_PROMPT_ID,
-                "value": json.dumps(event.prompt_id),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_ERROR_TYPE,
-                "value": json.dumps(event.error_type),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_ERROR_STATUS_CODE,
-                "value": json.dumps(event.status_code),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_API_ERROR_DURATION_MS,
-                "value": json.dumps(event.duration_ms),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_AUTH_TYPE,
-                "value": json.dumps(event.auth_type),
-            },
-        ]
-
-        self.enqueue_log_event(self.create_log_event(api_error_event_name, data))
-        self.flush_if_needed()
+        self._queue.put((ClearcutLogger._record_api_error_event, event))
 
     def log_flash_fallback_event(self, event: FlashFallbackEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_AUTH_TYPE,
-                "value": json.dumps(event.auth_type),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_SESSION_ID,
-                "value": self.config.get_session_id() if self.config else "",
-            },
-        ]
-
-        self.enqueue_log_event(self.create_log_event(flash_fallback_event_name, data))
-        asyncio.create_task(self.flush_to_clearcut())
+        self._queue.put((ClearcutLogger._record_flash_fallback_event, event))
+        # 立即刷新
+        self._queue.put(_FLUSH)
 
     def log_loop_detected_event(self, event: LoopDetectedEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_PROMPT_ID,
-                "value": json.dumps(event.prompt_id),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_LOOP_DETECTED_TYPE,
-                "value": json.dumps(event.loop_type),
-            },
-        ]
-
-        self.enqueue_log_event(self.create_log_event(loop_detected_event_name, data))
-        self.flush_if_needed()
+        self._queue.put((ClearcutLogger._record_loop_detected_event, event))
 
     def log_next_speaker_check(self, event: NextSpeakerCheckEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_PROMPT_ID,
-                "value": json.dumps(event.prompt_id),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_RESPONSE_FINISH_REASON,
-                "value": json.dumps(event.finish_reason),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_NEXT_SPEAKER_CHECK_RESULT,
-                "value": json.dumps(event.result),
-            },
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_SESSION_ID,
-                "value": self.config.get_session_id() if self.config else "",
-            },
-        ]
+        self._queue.put((ClearcutLogger._record_next_speaker_check, event))
 
-        self.enqueue_log_event(
-            self.create_log_event(next_speaker_check_event_name, data),
+    def log_slash_command_event(self, event: SlashCommandEvent) -> None:
+        self._queue.put((ClearcutLogger._record_slash_command_event, event))
+
+    def log_malformed_json_response_event(self, event: MalformedJsonResponseEvent) -> None:
+        self._queue.put((ClearcutLogger._record_malformed_json_response_event, event))
+
+    def log_end_session_event(self, event: EndSessionEvent) -> None:
+        self._queue.put((ClearcutLogger._record_end_session_event, event))
+        # 立即刷新
+        self._queue.put(_FLUSH)
+
+    def _record_start_session_event(self, event: StartSessionEvent) -> None:
+        surface = "CLOUD_SHELL" if os.environ.get('CLOUD_SHELL') == 'true' else (os.environ.get('SURFACE') or "SURFACE_NOT_SET")
+
+        values = (
+            event.model,
+            self._session_id,
+            event.embedding_model,
+            str(event.sandbox_enabled),
+            event.core_tools_enabled,
+            event.approval_mode,
+            str(event.api_key_enabled),
+            str(event.vertex_ai_enabled),
+            str(event.debug_enabled),
+            event.mcp_servers,
+            str(event.telemetry_enabled),
+            str(event.telemetry_log_user_prompts_enabled),
+            surface,
         )
-        self.flush_if_needed()
 
-    def log_slash_command_event(self, event: SlashCommandEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_SLASH_COMMAND_NAME,
-                "value": json.dumps(event.command),
-            },
-        ]
+        self.enqueue_log_event(self.create_log_event(start_session_event_name, self._START_SESSION_KEYS, values))
 
+    def _record_new_prompt_event(self, event: UserPromptEvent) -> None:
+        values = (
+            _scalar(event.prompt_length),
+            self._session_id,
+            _scalar(event.prompt_id),
+            _scalar(event.auth_type),
+        )
+
+        self.enqueue_log_event(self.create_log_event(new_prompt_event_name, self._NEW_PROMPT_KEYS, values))
+
+    def _record_tool_call_event(self, event: ToolCallEvent) -> None:
+        values = (
+            _scalar(event.function_name),
+            _scalar(event.prompt_id),
+            _scalar(event.decision),
+            _scalar(event.success),
+            _scalar(event.duration_ms),
+            _scalar(event.error),
+            _scalar(event.error_type),
+        )
+
+        log_event = self.create_log_event(tool_call_event_name, self._TOOL_CALL_KEYS, values)
+        self.enqueue_log_event(log_event)
+
+    def _record_api_request_event(self, event: ApiRequestEvent) -> None:
+        values = (
+            _scalar(event.model),
+            _scalar(event.prompt_id),
+        )
+
+        self.enqueue_log_event(self.create_log_event(api_request_event_name, self._API_REQUEST_KEYS, values))
+
+    def _record_api_response_event(self, event: ApiResponseEvent) -> None:
+        values = (
+            _scalar(event.model),
+            _scalar(event.prompt_id),
+            _scalar(event.status_code),
+            _scalar(event.duration_ms),
+            _scalar(event.error),
+            _scalar(event.input_token_count),
+            _scalar(event.output_token_count),
+            _scalar(event.cached_content_token_count),
+            _scalar(event.thoughts_token_count),
+            _scalar(event.tool_token_count),
+            _scalar(event.auth_type),
+        )
+
+        self.enqueue_log_event(self.create_log_event(api_response_event_name, self._API_RESPONSE_KEYS, values))
+
+    def _record_api_error_event(self, event: ApiErrorEvent) -> None:
+        values = (
+            _scalar(event.model),
+            _scalar(event.prompt_id),
+            _scalar(event.error_type),
+            _scalar(event.status_code),
+            _scalar(event.duration_ms),
+            _scalar(event.auth_type),
+        )
+
+        self.enqueue_log_event(self.create_log_event(api_error_event_name, self._API_ERROR_KEYS, values))
+
+    def _record_flash_fallback_event(self, event: FlashFallbackEvent) -> None:
+        values = (
+            _scalar(event.auth_type),
+            self._session_id,
+        )
+
+        self.enqueue_log_event(self.create_log_event(flash_fallback_event_name, self._FLASH_FALLBACK_KEYS, values))
+
+    def _record_loop_detected_event(self, event: LoopDetectedEvent) -> None:
+        values = (
+            _scalar(event.prompt_id),
+            _scalar(event.loop_type),
+        )
+
+        self.enqueue_log_event(self.create_log_event(loop_detected_event_name, self._LOOP_DETECTED_KEYS, values))
+
+    def _record_next_speaker_check(self, event: NextSpeakerCheckEvent) -> None:
+        values = (
+            _scalar(event.prompt_id),
+            _scalar(event.finish_reason),
+            _scalar(event.result),
+            self._session_id,
+        )
+
+        self.enqueue_log_event(
+            self.create_log_event(next_speaker_check_event_name, self._NEXT_SPEAKER_CHECK_KEYS, values),
+        )
+
+    def _record_slash_command_event(self, event: SlashCommandEvent) -> None:
         if event.subcommand:
-            data.append({
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_SLASH_COMMAND_SUBCOMMAND,
-                "value": json.dumps(event.subcommand),
-            })
+            values = (_scalar(event.command), _scalar(event.subcommand))
+        else:
+            values = (_scalar(event.command),)
 
-        self.enqueue_log_event(self.create_log_event(slash_command_event_name, data))
-        self.flush_if_needed()
+        self.enqueue_log_event(self.create_log_event(slash_command_event_name, self._SLASH_COMMAND_KEYS, values))
 
-    def log_malformed_json_response_event(self, event: MalformedJsonResponseEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_MALFORMED_JSON_RESPONSE_MODEL,
-                "value": json.dumps(event.model),
-            },
-        ]
+    def _record_malformed_json_response_event(self, event: MalformedJsonResponseEvent) -> None:
+        values = (
+            _scalar(event.model),
+        )
 
         self.enqueue_log_event(
-            self.create_log_event(malformed_json_response_event_name, data),
+            self.create_log_event(malformed_json_response_event_name, self._MALFORMED_JSON_RESPONSE_KEYS, values),
         )
-        self.flush_if_needed()
 
-    def log_end_session_event(self, event: EndSessionEvent) -> None:
-        data = [
-            {
-                "gemini_cli_key": EventMetadataKey.GEMINI_CLI_SESSION_ID,
-                "value": str(event.session_id) if event.session_id else "",
-            },
-        ]
+    def _record_end_session_event(self, event: EndSessionEvent) -> None:
+        values = (
+            str(event.session_id) if event.session_id else "",
+        )
 
-        # 会话结束时立即刷新
-        self.enqueue_log_event(self.create_log_event(end_session_event_name, data))
-        asyncio.create_task(self.flush_to_clearcut())
+        self.enqueue_log_event(self.create_log_event(end_session_event_name, self._END_SESSION_KEYS, values))
 
     def get_proxy_agent(self) -> Optional[aiohttp.ClientSession]:
         proxy_url = self.config.get_proxy() if self.config else None
@@ -509,11 +625,14 @@ class ClearcutLogger:
         # 支持http和https代理
         if proxy_url.startswith('http'):
             connector = ProxyConnector.from_url(proxy_url)
-            return aiohttp.ClientSession(connector=connector)
+            return aiohttp.ClientSession(connector=connector, timeout=self._REQUEST_TIMEOUT)
         else:
             raise ValueError('Unsupported proxy type')
 
     def shutdown(self) -> None:
         event = EndSessionEvent(self.config)
         self.log_end_session_event(event)
+        # worker 完成最后一次刷新后关闭 HTTP 会话并退出
+        self._queue.put(_STOP)
+        self._worker.join(timeout=self._SHUTDOWN_TIMEOUT_S)
 
@@ -196,6 +196,11 @@ class EventMetadataKey(Enum):
     GEMINI_CLI_MALFORMED_JSON_RESPONSE_MODEL = 45
 
 
+# 键名到枚举成员 / 整数值的映射，导入时构建一次（__members__ 同时包含别名）
+_KEY_MAP = dict(EventMetadataKey.__members__)
+_KEY_INT_MAP = {name: member.value for name, member in _KEY_MAP.items()}
+
+
 def get_event_metadata_key(key_name: str) -> Optional[EventMetadataKey]:
     """
     根据键名获取对应的事件元数据键枚举值。
@@ -206,7 +211,4 @@ def get_event_metadata_key(key_name: str) -> Optional[EventMetadataKey]:
     Returns:
         对应的事件元数据键枚举值，如果不存在则返回 None
     """
-    try:
-        return EventMetadataKey[key_name]
-    except KeyError:
-        return None
\ No newline at end of file
+    return _KEY_MAP.get(key_name)
\ No newline at end of file
@@ -4,117 +4,125 @@ Copyright 2025 Google LLC
 SPDX-License-Identifier: Apache-2.0
 """
 
+import atexit
 import json
+import logging
+import queue
+import sys
+import threading
+import time
+import weakref
 from datetime import datetime
-from typing import Dict, Any, Optional
-
-# 从对应模块导入需要的配置和类型
-def import_telemetry_deps():
-    # 这是一个模拟导入函数，实际使用时需要替换为正确的导入路径
-    try:
-        from ..config.config import Config
-        from .constants import (
-            EVENT_API_ERROR,
-            EVENT_API_REQUEST,
-            EVENT_API_RESPONSE,
-            EVENT_CLI_CONFIG,
-            EVENT_TOOL_CALL,
-            EVENT_USER_PROMPT,
-            EVENT_FLASH_FALLBACK,
-            EVENT_NEXT_SPEAKER_CHECK,
-            SERVICE_NAME,
-            EVENT_SLASH_COMMAND,
-        )
-        from .types import (
-            ApiErrorEvent,
-            ApiRequestEvent,
-            ApiResponseEvent,
-            StartSessionEvent,
-            ToolCallEvent,
-            UserPromptEvent,
-            FlashFallbackEvent,
-            NextSpeakerCheckEvent,
-            LoopDetectedEvent,
-            SlashCommandEvent,
-        )
-        from .metrics import (
-            record_api_error_metrics,
-            record_token_usage_metrics,
-            record_api_response_metrics,
-            record_tool_call_metrics,
-        )
-        from .sdk import is_telemetry_sdk_initialized
-        from .uiTelemetry import ui_telemetry_service, UiEvent
-        from .clearcut_logger.clearcut_logger import ClearcutLogger
-        from ..utils.safeJsonStringify import safe_json_stringify
-        
-        # 假设的 OpenTelemetry 相关导入
-        # 实际项目中需要根据 Python 的 OpenTelemetry API 进行调整
-        from opentelemetry.api.logs import logs
-        from opentelemetry.semantic_conventions import SemanticAttributes
-        
-        return {
-            'Config': Config,
-            'EVENT_API_ERROR': EVENT_API_ERROR,
-            'EVENT_API_REQUEST': EVENT_API_REQUEST,
-            'EVENT_API_RESPONSE': EVENT_API_RESPONSE,
-            'EVENT_CLI_CONFIG': EVENT_CLI_CONFIG,
-            'EVENT_TOOL_CALL': EVENT_TOOL_CALL,
-            'EVENT_USER_PROMPT': EVENT_USER_PROMPT,
-            'EVENT_FLASH_FALLBACK': EVENT_FLASH_FALLBACK,
-            'EVENT_NEXT_SPEAKER_CHECK': EVENT_NEXT_SPEAKER_CHECK,
-            'SERVICE_NAME': SERVICE_NAME,
-            'EVENT_SLASH_COMMAND': EVENT_SLASH_COMMAND,
-            'record_api_error_metrics': record_api_error_metrics,
-            'record_token_usage_metrics': record_token_usage_metrics,
-            'record_api_response_metrics': record_api_response_metrics,
-            'record_tool_call_metrics': record_tool_call_metrics,
-            'is_telemetry_sdk_initialized': is_telemetry_sdk_initialized,
-            'ui_telemetry_service': ui_telemetry_service,
-            'UiEvent': UiEvent,
-            'ClearcutLogger': ClearcutLogger,
-            'safe_json_stringify': safe_json_stringify,
-            'logs': logs,
-            'SemanticAttributes': SemanticAttributes
-        }
-    except ImportError as e:
-        # 在实际应用中，这里应该有更合适的错误处理
-        print(f"Import error: {e}")
-        return None
-
-# 获取导入的依赖
-deps = import_telemetry_deps()
-
-# 定义一个安全获取依赖项的函数
-def get_dep(name: str) -> Any:
-    if deps and name in deps:
-        return deps[name]
-    # 对于未找到的依赖，返回默认值或引发异常
-    # 在实际应用中，这里应该有更合适的错误处理
-    return None
-
-# 从依赖中获取常量和函数
-logs = get_dep('logs')
-SemanticAttributes = get_dep('SemanticAttributes')
-EVENT_API_ERROR = get_dep('EVENT_API_ERROR')
-EVENT_API_REQUEST = get_dep('EVENT_API_REQUEST')
-EVENT_API_RESPONSE = get_dep('EVENT_API_RESPONSE')
-EVENT_CLI_CONFIG = get_dep('EVENT_CLI_CONFIG')
-EVENT_TOOL_CALL = get_dep('EVENT_TOOL_CALL')
-EVENT_USER_PROMPT = get_dep('EVENT_USER_PROMPT')
-EVENT_FLASH_FALLBACK = get_dep('EVENT_FLASH_FALLBACK')
-EVENT_NEXT_SPEAKER_CHECK = get_dep('EVENT_NEXT_SPEAKER_CHECK')
-SERVICE_NAME = get_dep('SERVICE_NAME')
-EVENT_SLASH_COMMAND = get_dep('EVENT_SLASH_COMMAND')
-record_api_error_metrics = get_dep('record_api_error_metrics')
-record_token_usage_metrics = get_dep('record_token_usage_metrics')
-record_api_response_metrics = get_dep('record_api_response_metrics')
-record_tool_call_metrics = get_dep('record_tool_call_metrics')
-is_telemetry_sdk_initialized = get_dep('is_telemetry_sdk_initialized')
-ui_telemetry_service = get_dep('ui_telemetry_service')
-UiEvent = get_dep('UiEvent')
-ClearcutLogger = get_dep('ClearcutLogger')
-safe_json_stringify = get_dep('safe_json_stringify')
+from typing import Callable, Dict, Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 各组依赖分别导入，缺失的可选依赖绑定为 None（或等价的空实现），对应的日志输出被跳过
+try:
+    from .constants import (
+        EVENT_API_ERROR,
+        EVENT_API_REQUEST,
+        EVENT_API_RESPONSE,
+        EVENT_CLI_CONFIG,
+        EVENT_TOOL_CALL,
+        EVENT_USER_PROMPT,
+        EVENT_FLASH_FALLBACK,
+        EVENT_NEXT_SPEAKER_CHECK,
+        SERVICE_NAME,
+        EVENT_SLASH_COMMAND,
+    )
+except ImportError:
+    EVENT_API_ERROR = None
+    EVENT_API_REQUEST = None
+    EVENT_API_RESPONSE = None
+    EVENT_CLI_CONFIG = None
+    EVENT_TOOL_CALL = None
+    EVENT_USER_PROMPT = None
+    EVENT_FLASH_FALLBACK = None
+    EVENT_NEXT_SPEAKER_CHECK = None
+    SERVICE_NAME = None
+    EVENT_SLASH_COMMAND = None
+
+try:
+    from .metrics import (
+        record_api_error_metrics,
+        record_token_usage_metrics,
+        record_api_response_metrics,
+        record_tool_call_metrics,
+    )
+except ImportError:
+    record_api_error_metrics = None
+    record_token_usage_metrics = None
+    record_api_response_metrics = None
+    record_tool_call_metrics = None
+
+try:
+    from .sdk import is_telemetry_sdk_initialized
+except ImportError:
+    # 遥测 SDK 不可用时视为未初始化，各 log_* 函数只需一次调用即可短路
+    def is_telemetry_sdk_initialized() -> bool:
+        return False
+
+try:
+    from .uiTelemetry import ui_telemetry_service, UiEvent
+except ImportError:
+    ui_telemetry_service = None
+    UiEvent = None
+
+try:
+    from .clearcut_logger.clearcut_logger import ClearcutLogger
+except ImportError:
+    ClearcutLogger = None
+
+try:
+    from ..utils.safe_json_stringify import safe_json_stringify
+except ImportError:
+    safe_json_stringify = None
+
+# 假设的 OpenTelemetry 相关导入
+# 实际项目中需要根据 Python 的 OpenTelemetry API 进行调整
+try:
+    from opentelemetry.api.logs import logs
+    from opentelemetry.semantic_conventions import SemanticAttributes
+except ImportError:
+    logs = None
+    SemanticAttributes = None
+
+
+# 整秒部分的 ISO 字符串缓存 (秒, 字符串)，同一秒内的事件只需拼接微秒部分。
+# 整体替换元组，多线程下读到的秒数与字符串总是一致的
+_ts_cache = (-1, '')
+
+
+def _iso_now() -> str:
+    """返回当前本地时间的 ISO 8601 字符串（微秒精度）"""
+    return _iso_from_ns(time.time_ns())
+
+
+def _iso_from_ns(timestamp_ns: int) -> str:
+    """将纳秒级 Unix 时间戳格式化为本地时间的 ISO 8601 字符串（微秒精度）"""
+    global _ts_cache
+    seconds, nanos = divmod(timestamp_ns, 1_000_000_000)
+    cached_seconds, prefix = _ts_cache
+    if seconds != cached_seconds:
+        prefix = datetime.fromtimestamp(seconds).isoformat()
+        _ts_cache = (seconds, prefix)
+    return f'{prefix}.{nanos // 1000:06d}'
+
+
+# OpenTelemetry logger 在首次使用时获取并缓存，避免每个事件都查一次 provider 注册表
+_logger = None
+
+
+def _get_logger() -> Any:
+    """获取（并缓存）本服务的 OpenTelemetry logger"""
+    global _logger
+    if _logger is None and logs is not None:
+        _logger = logs.get_logger(SERVICE_NAME)
+    return _logger
 
 
 def should_log_user_prompts(config: Any) -> bool:
@@ -122,23 +130,212 @@ def should_log_user_prompts(config: Any) -> bool:
     return config.get_telemetry_log_prompts_enabled()
 
 
+# 会话内通用属性不变，按 Config 实例缓存（调用方只读，不得修改返回的字典）
+_common_attributes_cache: 'weakref.WeakKeyDictionary[Any, Dict[str, Any]]' = weakref.WeakKeyDictionary()
+
+
 def get_common_attributes(config: Any) -> Dict[str, Any]:
     """获取通用的日志属性"""
-    return {
-        'session.id': config.get_session_id(),
-    }
+    attributes = _common_attributes_cache.get(config)
+    if attributes is None:
+        session_id = config.get_session_id()
+        if isinstance(session_id, str):
+            # 会话 ID 会在每条日志中被导出器反复哈希，驻留后可复用同一对象及其哈希值
+            session_id = sys.intern(session_id)
+        attributes = {
+            'session.id': session_id,
+        }
+        _common_attributes_cache[config] = attributes
+    return attributes
+
+# 每个 Config 对应的 ClearcutLogger 实例（未启用使用统计时为 None），只解析一次
+_clearcut_loggers: 'weakref.WeakKeyDictionary[Any, Any]' = weakref.WeakKeyDictionary()
+
+
+def _get_clearcut_logger(config: Any) -> Optional[Any]:
+    """获取（并按 Config 缓存）ClearcutLogger 实例"""
+    try:
+        return _clearcut_loggers[config]
+    except KeyError:
+        pass
+    instance = ClearcutLogger.getInstance(config) if ClearcutLogger else None
+    _clearcut_loggers[config] = instance
+    return instance
+
+# 已序列化的 function_args（按事件对象缓存），同一事件重复记录时不再重新序列化。
+# 不写回事件的 __dict__，以免缓存字段混入 ui_event 和日志属性
+_function_args_cache: 'weakref.WeakKeyDictionary[Any, str]' = weakref.WeakKeyDictionary()
+
+
+def _function_args_json(event: Any) -> str:
+    """将工具调用参数序列化为紧凑的 JSON 字符串"""
+    try:
+        return _function_args_cache[event]
+    except KeyError:
+        pass
+    function_args_str = _serialize_function_args(event.function_args)
+    _function_args_cache[event] = function_args_str
+    return function_args_str
+
+
+def _serialize_function_args(function_args: Any) -> str:
+    if orjson is not None:
+        # orjson 比标准库快数倍；遇到无法序列化的对象或循环引用时抛出
+        # JSONEncodeError（TypeError 的子类），再交给 safe_json_stringify 兜底
+        try:
+            return orjson.dumps(function_args).decode()
+        except TypeError:
+            pass
+    if safe_json_stringify:
+        return safe_json_stringify(function_args)
+    try:
+        return json.dumps(function_args, ensure_ascii=False, separators=(',', ':'))
+    except Exception:
+        return 'Failed to serialize function_args'
+
+# OpenTelemetry 日志与指标的记录在后台线程中完成，调用线程只负责入队（事件时间以
+# time.time_ns() 整数记录，ISO 字符串在后台线程中格式化）；
+# 配置了文件等同步导出器时，其 write 系统调用也都发生在该线程上。
+# 队列积压超过上限时丢弃新事件，避免突发事件占用无限内存；首次及此后每
+# _DROP_LOG_INTERVAL 次丢弃记录一条调试日志，退出时汇报丢弃总数
+_MAX_QUEUED_EMITS = 10_000
+_DROP_LOG_INTERVAL = 1_000
+_STOP = object()
+_emit_queue: 'queue.SimpleQueue[Any]' = queue.SimpleQueue()
+_emit_worker: Optional[threading.Thread] = None
+_emit_worker_lock = threading.Lock()
+_dropped_emits = 0
+_debug_logger = logging.getLogger(__name__)
+
+
+def _run_emit_worker() -> None:
+    """后台线程：依次执行队列中的发送任务，直到收到停止标记"""
+    while True:
+        item = _emit_queue.get()
+        if item is _STOP:
+            return
+        emit, args = item
+        try:
+            emit(*args)
+        except Exception as e:
+            _debug_logger.debug('Failed to emit telemetry event: %s', e)
+
+
+def _submit(emit: Any, *args: Any) -> None:
+    """将发送任务放入后台队列，首次调用时启动后台线程
+
+    每个事件只入队一个任务：日志发送与对应的 record_*_metrics 在同一任务中依次完成。
+    """
+    global _emit_worker, _dropped_emits
+    if _emit_worker is None:
+        with _emit_worker_lock:
+            if _emit_worker is None:
+                worker = threading.Thread(target=_run_emit_worker, name='telemetry-logger', daemon=True)
+                worker.start()
+                _emit_worker = worker
+    if _emit_queue.qsize() >= _MAX_QUEUED_EMITS:
+        _dropped_emits += 1
+        if _dropped_emits % _DROP_LOG_INTERVAL == 1:
+            _debug_logger.debug(
+                'Telemetry emit queue is full (%d pending); dropped %d event(s) so far',
+                _MAX_QUEUED_EMITS, _dropped_emits,
+            )
+        return
+    _emit_queue.put_nowait((emit, args))
+
+
+def _stop_emit_worker(timeout: float = 2.0) -> None:
+    """进程退出前尽量发送完已入队的事件"""
+    global _emit_worker
+    with _emit_worker_lock:
+        worker, _emit_worker = _emit_worker, None
+    if worker is not None and worker.is_alive():
+        _emit_queue.put(_STOP)
+        worker.join(timeout)
+    if _dropped_emits:
+        _debug_logger.debug('Dropped %d telemetry event(s) because the emit queue was full', _dropped_emits)
+
+
+atexit.register(_stop_emit_worker)
+
+# API 响应事件中的 token 计数字段及其对应的指标类型
+_TOKEN_FIELDS = (
+    ('input_token_count', 'input'),
+    ('output_token_count', 'output'),
+    ('cached_content_token_count', 'cache'),
+    ('thoughts_token_count', 'thought'),
+    ('tool_token_count', 'tool'),
+)
+
+
+def _event_attributes(config: Any, event: Any) -> Dict[str, Any]:
+    """以通用属性为基础复制事件的全部字段，作为日志属性字典"""
+    # dict 复制 + update 均在 C 层完成，比 {**a, **b} 展开或逐键 getattr 更快。
+    # 每次返回新字典，不做对象池复用：logger.emit 之后批量导出器仍可能持有该字典
+    attributes = dict(get_common_attributes(config))
+    attributes.update(event.__dict__)
+    return attributes
+
+def _ui_event_attributes(
+    config: Any,
+    event: Any,
+    ui_event: Optional[Dict[str, Any]],
+    event_name: Optional[str],
+    timestamp_ns: int,
+) -> Dict[str, Any]:
+    """构建与 ui_event 字段一致的日志属性字典
+
+    ui_event 已交给 UI 遥测服务时复制一份再补充，避免后续写入的属性影响 UI 侧；
+    没有 UI 遥测服务时直接从事件字段构建，事件字段同样只展开一次。
+    """
+    attributes = dict(get_common_attributes(config))
+    if ui_event is not None:
+        attributes.update(ui_event)
+    else:
+        attributes.update(event.__dict__)
+        attributes['event.name'] = event_name
+        attributes['event.timestamp'] = _iso_from_ns(timestamp_ns)
+    return attributes
+
+
+def _make_event_emitter(
+    extra_attributes: Dict[str, Any],
+    body: Union[str, Callable[[Any], str]],
+) -> Callable[..., None]:
+    """为展开全部事件字段的一类事件生成专用的发送函数
+
+    extra_attributes 为该事件类型固定追加的属性（如 event.name）。body 为固定的日志正文，
+    或根据事件生成正文的函数；固定正文直接复用同一个字符串对象。
+    """
+    constant_body = isinstance(body, str)
+
+    def emit(config: Any, event: Any, timestamp_ns: Optional[int] = None) -> None:
+        attributes = _event_attributes(config, event)
+        attributes.update(extra_attributes)
+        if timestamp_ns is not None:
+            attributes['event.timestamp'] = _iso_from_ns(timestamp_ns)
+        _get_logger().emit({
+            'body': body if constant_body else body(event),
+            'attributes': attributes,
+        })
+
+    return emit
 
 def log_cli_configuration(config: Any, event: Any) -> None:
     """记录CLI配置信息"""
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_start_session_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_start_session_event(event)
     if not is_telemetry_sdk_initialized():
         return
+    _submit(_emit_cli_configuration, config, event, time.time_ns())
 
+def _emit_cli_configuration(config: Any, event: Any, timestamp_ns: int) -> None:
+    """记录CLI配置信息（在后台线程中执行）"""
     attributes: Dict[str, Any] = {
         **get_common_attributes(config),
         'event.name': EVENT_CLI_CONFIG,
-        'event.timestamp': datetime.now().isoformat(),
+        'event.timestamp': _iso_from_ns(timestamp_ns),
         'model': event.model,
         'embedding_model': event.embedding_model,
         'sandbox_enabled': event.sandbox_enabled,
@@ -152,7 +349,7 @@ def log_cli_configuration(config: Any, event: Any) -> None:
         'mcp_servers': event.mcp_servers,
     }
 
-    logger = logs.get_logger(SERVICE_NAME)
+    logger = _get_logger()
     log_record = {
         'body': 'CLI configuration loaded.',
         'attributes': attributes,
@@ -161,22 +358,26 @@ def log_cli_configuration(config: Any, event: Any) -> None:
 
 def log_user_prompt(config: Any, event: Any) -> None:
     """记录用户提示信息"""
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_new_prompt_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_new_prompt_event(event)
     if not is_telemetry_sdk_initialized():
         return
+    _submit(_emit_user_prompt, config, event, time.time_ns())
 
+def _emit_user_prompt(config: Any, event: Any, timestamp_ns: int) -> None:
+    """记录用户提示信息（在后台线程中执行）"""
     attributes: Dict[str, Any] = {
         **get_common_attributes(config),
         'event.name': EVENT_USER_PROMPT,
-        'event.timestamp': datetime.now().isoformat(),
+        'event.timestamp': _iso_from_ns(timestamp_ns),
         'prompt_length': event.prompt_length,
     }
 
     if should_log_user_prompts(config):
         attributes['prompt'] = event.prompt
 
-    logger = logs.get_logger(SERVICE_NAME)
+    logger = _get_logger()
     log_record = {
         'body': f'User prompt. Length: {event.prompt_length}.',
         'attributes': attributes,
@@ -185,261 +386,220 @@ def log_user_prompt(config: Any, event: Any) -> None:
 
 def log_tool_call(config: Any, event: Any) -> None:
     """记录工具调用信息"""
-    ui_event = {
-        **vars(event),  # 将事件对象转换为字典
-        'event.name': EVENT_TOOL_CALL,
-        'event.timestamp': datetime.now().isoformat(),
-    }
+    # 只有 UI 遥测服务存在时才在调用线程上构建 ui_event；
+    # OpenTelemetry 属性在后台线程中基于它（或直接基于事件）构建
+    ui_event = None
     if ui_telemetry_service:
+        ui_event = dict(event.__dict__)
+        ui_event['event.name'] = EVENT_TOOL_CALL
+        ui_event['event.timestamp'] = _iso_now()
         ui_telemetry_service.add_event(ui_event)
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_tool_call_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_tool_call_event(event)
     if not is_telemetry_sdk_initialized():
         return
+    _submit(_emit_tool_call, config, event, ui_event, time.time_ns())
 
+def _emit_tool_call(config: Any, event: Any, ui_event: Optional[Dict[str, Any]], timestamp_ns: int) -> None:
+    """记录工具调用信息（在后台线程中执行）"""
+    # 可选字段统一从 __dict__ 取值，避免 hasattr + getattr 两次查找
+    d = event.__dict__
     # 安全处理function_args
     function_args_str = ''
-    if hasattr(event, 'function_args'):
-        if safe_json_stringify:
-            function_args_str = safe_json_stringify(event.function_args, 2)
-        else:
-            try:
-                function_args_str = json.dumps(event.function_args, ensure_ascii=False, indent=2)
-            except Exception:
-                function_args_str = 'Failed to serialize function_args'
-
-    attributes: Dict[str, Any] = {
-        **get_common_attributes(config),
-        **vars(event),  # 将事件对象的属性添加到字典
-        'event.name': EVENT_TOOL_CALL,
-        'event.timestamp': datetime.now().isoformat(),
-        'function_args': function_args_str,
-    }
-
-    if hasattr(event, 'error') and event.error:
-        attributes['error.message'] = event.error
-        if hasattr(event, 'error_type') and event.error_type:
-            attributes['error.type'] = event.error_type
-
-    logger = logs.get_logger(SERVICE_NAME)
-    decision_text = f'. Decision: {event.decision}' if hasattr(event, 'decision') and event.decision else ''
+    if 'function_args' in d:
+        function_args_str = _function_args_json(event)
+
+    attributes = _ui_event_attributes(config, event, ui_event, EVENT_TOOL_CALL, timestamp_ns)
+    attributes['function_args'] = function_args_str
+
+    error = d.get('error')
+    if error:
+        attributes['error.message'] = error
+        error_type = d.get('error_type')
+        if error_type:
+            attributes['error.type'] = error_type
+
+    logger = _get_logger()
+    decision = d.get('decision')
+    # 两种正文各用一个 f-string 一次拼出，不再先生成中间的 decision 片段
+    if decision:
+        body = f'Tool call: {event.function_name}. Decision: {decision}. Success: {event.success}. Duration: {event.duration_ms}ms.'
+    else:
+        body = f'Tool call: {event.function_name}. Success: {event.success}. Duration: {event.duration_ms}ms.'
     log_record = {
-        'body': f'Tool call: {event.function_name}{decision_text}. Success: {event.success}. Duration: {event.duration_ms}ms.',
+        'body': body,
         'attributes': attributes,
     }
     logger.emit(log_record)
-    
+
     if record_tool_call_metrics:
         record_tool_call_metrics(
             config,
             event.function_name,
             event.duration_ms,
             event.success,
-            event.decision if hasattr(event, 'decision') else None,
+            decision,
         )
 
 def log_api_request(config: Any, event: Any) -> None:
     """记录API请求信息"""
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_api_request_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_api_request_event(event)
     if not is_telemetry_sdk_initialized():
         return
+    _submit(_emit_api_request, config, event, time.time_ns())
 
-    attributes: Dict[str, Any] = {
-        **get_common_attributes(config),
-        **vars(event),
-        'event.name': EVENT_API_REQUEST,
-        'event.timestamp': datetime.now().isoformat(),
-    }
-
-    logger = logs.get_logger(SERVICE_NAME)
-    log_record = {
-        'body': f'API request to {event.model}.',
-        'attributes': attributes,
-    }
-    logger.emit(log_record)
+_emit_api_request = _make_event_emitter({'event.name': EVENT_API_REQUEST}, lambda event: f'API request to {event.model}.')
 
 def log_flash_fallback(config: Any, event: Any) -> None:
     """记录Flash回退事件"""
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_flash_fallback_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_flash_fallback_event(event)
     if not is_telemetry_sdk_initialized():
         return
+    _submit(_emit_flash_fallback, config, event, time.time_ns())
 
-    attributes: Dict[str, Any] = {
-        **get_common_attributes(config),
-        **vars(event),
-        'event.name': EVENT_FLASH_FALLBACK,
-        'event.timestamp': datetime.now().isoformat(),
-    }
-
-    logger = logs.get_logger(SERVICE_NAME)
-    log_record = {
-        'body': 'Switching to flash as Fallback.',
-        'attributes': attributes,
-    }
-    logger.emit(log_record)
+_emit_flash_fallback = _make_event_emitter({'event.name': EVENT_FLASH_FALLBACK}, 'Switching to flash as Fallback.')
 
 def log_api_error(config: Any, event: Any) -> None:
     """记录API错误信息"""
-    ui_event = {
-        **vars(event),
-        'event.name': EVENT_API_ERROR,
-        'event.timestamp': datetime.now().isoformat(),
-    }
+    # 只有 UI 遥测服务存在时才在调用线程上构建 ui_event；
+    # OpenTelemetry 属性在后台线程中基于它（或直接基于事件）构建
+    ui_event = None
     if ui_telemetry_service:
+        ui_event = dict(event.__dict__)
+        ui_event['event.name'] = EVENT_API_ERROR
+        ui_event['event.timestamp'] = _iso_now()
         ui_telemetry_service.add_event(ui_event)
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_api_error_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_api_error_event(event)
     if not is_telemetry_sdk_initialized():
         return
-
-    attributes: Dict[str, Any] = {
-        **get_common_attributes(config),
-        **vars(event),
-        'event.name': EVENT_API_ERROR,
-        'event.timestamp': datetime.now().isoformat(),
-        'error.message': event.error,
-        'model_name': event.model,
-        'duration': event.duration_ms,
-    }
-
-    if hasattr(event, 'error_type') and event.error_type:
-        attributes['error.type'] = event.error_type
-    if hasattr(event, 'status_code') and isinstance(event.status_code, (int, float)):
+    _submit(_emit_api_error, config, event, ui_event, time.time_ns())
+
+def _emit_api_error(config: Any, event: Any, ui_event: Optional[Dict[str, Any]], timestamp_ns: int) -> None:
+    """记录API错误信息（在后台线程中执行）"""
+    d = event.__dict__
+    error_type = d.get('error_type')
+    status_code = d.get('status_code')
+    attributes = _ui_event_attributes(config, event, ui_event, EVENT_API_ERROR, timestamp_ns)
+    attributes['error.message'] = event.error
+    attributes['model_name'] = event.model
+    attributes['duration'] = event.duration_ms
+
+    if error_type:
+        attributes['error.type'] = error_type
+    if isinstance(status_code, (int, float)):
         if SemanticAttributes:
-            attributes[SemanticAttributes.HTTP_STATUS_CODE] = event.status_code
+            attributes[SemanticAttributes.HTTP_STATUS_CODE] = status_code
 
-    logger = logs.get_logger(SERVICE_NAME)
+    logger = _get_logger()
     log_record = {
         'body': f'API error for {event.model}. Error: {event.error}. Duration: {event.duration_ms}ms.',
         'attributes': attributes,
     }
     logger.emit(log_record)
-    
+
     if record_api_error_metrics:
         record_api_error_metrics(
             config,
             event.model,
             event.duration_ms,
-            event.status_code if hasattr(event, 'status_code') else None,
-            event.error_type if hasattr(event, 'error_type') else None,
+            status_code,
+            error_type,
         )
 
 def log_api_response(config: Any, event: Any) -> None:
     """记录API响应信息"""
-    ui_event = {
-        **vars(event),
-        'event.name': EVENT_API_RESPONSE,
-        'event.timestamp': datetime.now().isoformat(),
-    }
+    # 只有 UI 遥测服务存在时才在调用线程上构建 ui_event；
+    # OpenTelemetry 属性在后台线程中基于它（或直接基于事件）构建
+    ui_event = None
     if ui_telemetry_service:
+        ui_event = dict(event.__dict__)
+        ui_event['event.name'] = EVENT_API_RESPONSE
+        ui_event['event.timestamp'] = _iso_now()
         ui_telemetry_service.add_event(ui_event)
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_api_response_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_api_response_event(event)
     if not is_telemetry_sdk_initialized():
         return
-
-    attributes: Dict[str, Any] = {
-        **get_common_attributes(config),
-        **vars(event),
-        'event.name': EVENT_API_RESPONSE,
-        'event.timestamp': datetime.now().isoformat(),
-    }
-    
-    if hasattr(event, 'response_text') and event.response_text:
-        attributes['response_text'] = event.response_text
-    if hasattr(event, 'error') and event.error:
-        attributes['error.message'] = event.error
-    elif hasattr(event, 'status_code') and event.status_code:
-        if isinstance(event.status_code, (int, float)) and SemanticAttributes:
-            attributes[SemanticAttributes.HTTP_STATUS_CODE] = event.status_code
-
-    logger = logs.get_logger(SERVICE_NAME)
-    status_code_text = event.status_code if hasattr(event, 'status_code') else 'N/A'
+    _submit(_emit_api_response, config, event, ui_event, time.time_ns())
+
+def _emit_api_response(config: Any, event: Any, ui_event: Optional[Dict[str, Any]], timestamp_ns: int) -> None:
+    """记录API响应信息（在后台线程中执行）"""
+    d = event.__dict__
+    error = d.get('error')
+    status_code = d.get('status_code')
+    attributes = _ui_event_attributes(config, event, ui_event, EVENT_API_RESPONSE, timestamp_ns)
+
+    response_text = d.get('response_text')
+    if response_text:
+        attributes['response_text'] = response_text
+    if error:
+        attributes['error.message'] = error
+    elif status_code:
+        if isinstance(status_code, (int, float)) and SemanticAttributes:
+            attributes[SemanticAttributes.HTTP_STATUS_CODE] = status_code
+
+    logger = _get_logger()
+    status_code_text = d.get('status_code', 'N/A')
     log_record = {
         'body': f'API response from {event.model}. Status: {status_code_text}. Duration: {event.duration_ms}ms.',
         'attributes': attributes,
     }
     logger.emit(log_record)
-    
+
     if record_api_response_metrics:
         record_api_response_metrics(
             config,
             event.model,
             event.duration_ms,
-            event.status_code if hasattr(event, 'status_code') else None,
-            event.error if hasattr(event, 'error') else None,
+            status_code,
+            error,
         )
-    
+
     if record_token_usage_metrics:
-        # 记录各种token使用量
-        if hasattr(event, 'input_token_count'):
-            record_token_usage_metrics(config, event.model, event.input_token_count, 'input')
-        if hasattr(event, 'output_token_count'):
-            record_token_usage_metrics(config, event.model, event.output_token_count, 'output')
-        if hasattr(event, 'cached_content_token_count'):
-            record_token_usage_metrics(config, event.model, event.cached_content_token_count, 'cache')
-        if hasattr(event, 'thoughts_token_count'):
-            record_token_usage_metrics(config, event.model, event.thoughts_token_count, 'thought')
-        if hasattr(event, 'tool_token_count'):
-            record_token_usage_metrics(config, event.model, event.tool_token_count, 'tool')
+        # 记录各种token使用量；计数为 0 时计数器累加无意义，直接跳过
+        model = event.model
+        for field, kind in _TOKEN_FIELDS:
+            token_count = d.get(field)
+            if token_count:
+                record_token_usage_metrics(config, model, token_count, kind)
 
 def log_loop_detected(config: Any, event: Any) -> None:
     """记录检测到的循环事件"""
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_loop_detected_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_loop_detected_event(event)
     if not is_telemetry_sdk_initialized():
         return
+    _submit(_emit_loop_detected, config, event)
 
-    attributes: Dict[str, Any] = {
-        **get_common_attributes(config),
-        **vars(event),
-    }
-
-    logger = logs.get_logger(SERVICE_NAME)
-    log_record = {
-        'body': f'Loop detected. Type: {event.loop_type}.',
-        'attributes': attributes,
-    }
-    logger.emit(log_record)
+_emit_loop_detected = _make_event_emitter({}, lambda event: f'Loop detected. Type: {event.loop_type}.')
 
 def log_next_speaker_check(config: Any, event: Any) -> None:
     """记录下一个发言者检查事件"""
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_next_speaker_check(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_next_speaker_check(event)
     if not is_telemetry_sdk_initialized():
         return
+    _submit(_emit_next_speaker_check, config, event)
 
-    attributes: Dict[str, Any] = {
-        **get_common_attributes(config),
-        **vars(event),
-        'event.name': EVENT_NEXT_SPEAKER_CHECK,
-    }
-
-    logger = logs.get_logger(SERVICE_NAME)
-    log_record = {
-        'body': 'Next speaker check.',
-        'attributes': attributes,
-    }
-    logger.emit(log_record)
+_emit_next_speaker_check = _make_event_emitter({'event.name': EVENT_NEXT_SPEAKER_CHECK}, 'Next speaker check.')
 
 def log_slash_command(config: Any, event: Any) -> None:
     """记录斜杠命令事件"""
-    if ClearcutLogger:
-        ClearcutLogger.get_instance(config).log_slash_command_event(event)
+    clearcut_logger = _get_clearcut_logger(config)
+    if clearcut_logger:
+        clearcut_logger.log_slash_command_event(event)
     if not is_telemetry_sdk_initialized():
         return
+    _submit(_emit_slash_command, config, event)
 
-    attributes: Dict[str, Any] = {
-        **get_common_attributes(config),
-        **vars(event),
-        'event.name': EVENT_SLASH_COMMAND,
-    }
-
-    logger = logs.get_logger(SERVICE_NAME)
-    log_record = {
-        'body': f'Slash command: {event.command}.',
-        'attributes': attributes,
-    }
-    logger.emit(log_record)
\ No newline at end of file
+_emit_slash_command = _make_event_emitter({'event.name': EVENT_SLASH_COMMAND}, lambda event: f'Slash command: {event.command}.')
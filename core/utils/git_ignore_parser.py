@@ -12,6 +12,11 @@ class GitIgnoreFilter:
         """检查文件是否被忽略"""
         pass
 
+    def filter(self, file_paths: List[str]) -> List[bool]:
+        """批量检查文件是否被忽略，返回与输入一一对应的结果"""
+        is_ignored = self.is_ignored
+        return [bool(is_ignored(file_path)) for file_path in file_paths]
+
     def get_patterns(self) -> List[str]:
         """获取所有忽略模式"""
         pass
@@ -97,6 +102,31 @@ class GitIgnoreParser(GitIgnoreFilter):
         normalized_path = relative_path.replace('\\', '/')
         return self.ig.ignores(normalized_path)
 
+    def filter(self, file_paths: List[str]) -> List[bool]:
+        """
+        批量检查文件是否被忽略
+
+        Args:
+            file_paths: 要检查的文件路径列表
+
+        Returns:
+            与输入一一对应的布尔列表，True 表示该文件被忽略
+        """
+        project_root = self.project_root
+        resolve = os.path.resolve
+        relpath = os.path.relpath
+        ignores = self.ig.ignores
+
+        result: List[bool] = []
+        append = result.append
+        for file_path in file_paths:
+            relative_path = relpath(resolve(project_root, file_path), project_root)
+            if relative_path == '' or relative_path.startswith('..'):
+                append(False)
+            else:
+                append(bool(ignores(relative_path.replace('\\', '/'))))
+        return result
+
     def get_patterns(self) -> List[str]:
         """
         获取所有忽略模式
@@ -0,0 +1,46 @@
+import unittest
+
+from core.services.loop_detection_service import (
+    CONTENT_CHUNK_SIZE,
+    Config,
+    GeminiEventType,
+    LoopDetectionService,
+    ServerGeminiStreamEvent,
+)
+
+
+def _feed(text: str, step: int = 5) -> bool:
+    """按小片段流式输入文本，返回是否检测到内容循环"""
+    service = LoopDetectionService(Config())
+    for i in range(0, len(text), step):
+        event = ServerGeminiStreamEvent(GeminiEventType.Content, text[i:i + step])
+        if service.add_and_check(event):
+            return True
+    return service.flush_pending_content()
+
+
+def _distinct_cjk(start: int, count: int) -> str:
+    return ''.join(chr(0x4e00 + start + i) for i in range(count))
+
+
+class ContentLoopNonAsciiTest(unittest.TestCase):
+    """块大小与历史长度按字符计，非 ASCII 文本与 ASCII 文本的判定一致"""
+
+    def test_short_repeated_cjk_phrase_is_not_a_loop(self):
+        # 19 个字符的短语间隔 6 个不同字符反复出现：按字符计，任何 50 字符的窗口都不重复
+        phrase = '这是一个重复出现的中文短语用于测试循环'
+        text = ''.join(phrase + _distinct_cjk(i * 6, 6) for i in range(40))
+        self.assertFalse(_feed(text))
+
+    def test_repeated_cjk_sentence_is_a_loop(self):
+        sentence = _distinct_cjk(1000, CONTENT_CHUNK_SIZE // 2) + '。'
+        text = _distinct_cjk(2000, 100) + sentence * 30
+        self.assertTrue(_feed(text))
+
+    def test_repeated_sentence_with_astral_characters_is_a_loop(self):
+        sentence = '再次执行相同的命令 😀 again, once more. '
+        self.assertTrue(_feed('开始' + sentence * 20))
+
+
+if __name__ == '__main__':
+    unittest.main()